@@ -91,10 +91,7 @@ async def get_locked_accounts(
                     "locked_until": locked_until.isoformat(),
                     "remaining_seconds": remaining_time,
                     "total_attempts": data.get("total_attempts", 0),
-                    "failed_attempts": len([
-                        a for a in data.get("attempts", [])
-                        if not a["success"]
-                    ])
+                    "failed_attempts": data.get("failed_attempts", 0)
                 })
         
         return locked_accounts
@@ -213,10 +210,7 @@ async def get_security_summary(
         
         # Статистика попыток входа
         total_attempts = sum(len(data.get("attempts", [])) for data in login_attempts.values())
-        failed_attempts = sum(
-            len([a for a in data.get("attempts", []) if not a["success"]])
-            for data in login_attempts.values()
-        )
+        failed_attempts = sum(data.get("failed_attempts", 0) for data in login_attempts.values())
         locked_accounts = sum(
             1 for data in login_attempts.values()
             if data.get("locked_until") and current_time < data["locked_until"]
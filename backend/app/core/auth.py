@@ -2,6 +2,7 @@ from datetime import datetime, timedelta
 from typing import Optional, Union, cast
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from cachetools import TLRUCache
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -13,6 +14,8 @@ from .schemas import TokenData
 from .config import settings
 from .security import LoginAttemptTracker, get_client_ip, CSRFProtection
 import secrets
+import threading
+import time
 
 # Настройка хеширования паролей
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -20,6 +23,23 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # Настройка JWT
 security = HTTPBearer()
 
+# Кеш проверенных JWT: подпись проверяется один раз на токен, а не на каждый запрос.
+# Запись живет не дольше TOKEN_CACHE_TTL секунд и не дольше срока действия самого токена.
+# Отзыв токенов кеш не обходит, потому что отзыва нет: logout только удаляет cookie, а JWT
+# остается валидным до exp. Если появится отзыв (например, blacklist по jti), его проверка
+# должна идти до поиска в кеше или удалять токен из _token_cache, иначе отозванный токен
+# будет приниматься еще до TOKEN_CACHE_TTL секунд
+TOKEN_CACHE_TTL = 60
+
+
+def _token_cache_ttu(token: str, payload: dict, now: float) -> float:
+    """Момент устаревания записи кеша по часам кеша (monotonic)"""
+    return now + min(TOKEN_CACHE_TTL, payload["exp"] - time.time())
+
+
+_token_cache: TLRUCache = TLRUCache(maxsize=10_000, ttu=_token_cache_ttu)
+_token_cache_lock = threading.Lock()
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Проверка пароля"""
@@ -56,11 +76,25 @@ def verify_token(token: str) -> Optional[dict]:
     if not token:
         return None
     
+    with _token_cache_lock:
+        payload = _token_cache.get(token)
+    
+    if payload is not None:
+        # Дешевая проверка срока вместо повторной проверки подписи
+        if payload["exp"] > time.time():
+            return dict(payload)
+        return None
+    
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
     except JWTError:
         return None
+    
+    # Токены без exp не кешируем: у записи не было бы верхней границы жизни
+    if isinstance(payload.get("exp"), (int, float)):
+        with _token_cache_lock:
+            _token_cache[token] = dict(payload)
+    return payload
 
 
 async def authenticate_user(login: str, password: str, db: AsyncSession) -> Optional[Union[Master, Employee, Administrator]]:
@@ -117,38 +151,38 @@ async def get_current_user(
     if not token:
         raise credentials_exception
     
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        
-        # Проверяем обязательные claims
-        login: str = cast(str, payload.get("sub"))
-        user_type: str = cast(str, payload.get("user_type"))
-        user_id: int = cast(int, payload.get("user_id"))
-        
-        # Проверяем дополнительные claims безопасности
-        iss = payload.get("iss")
-        jti = payload.get("jti")
-        iat = payload.get("iat")
-        
-        if login is None or user_type is None or user_id is None:
-            raise credentials_exception
-        
-        # Проверяем issuer
-        if iss != "request_management_system":
-            raise credentials_exception
-        
-        # Проверяем JWT ID (можно использовать для отзыва токенов)
-        if not jti:
-            raise credentials_exception
-        
-        # Проверяем время выдачи токена
-        if not iat or datetime.utcfromtimestamp(iat) > datetime.utcnow():
-            raise credentials_exception
-        
-        token_data = TokenData(login=login, role=user_type, user_id=user_id)
-    except JWTError:
+    # Подпись проверяется в verify_token; повторные запросы с тем же токеном берут payload из кеша
+    payload = verify_token(token)
+    if payload is None:
+        raise credentials_exception
+    
+    # Проверяем обязательные claims
+    login: str = cast(str, payload.get("sub"))
+    user_type: str = cast(str, payload.get("user_type"))
+    user_id: int = cast(int, payload.get("user_id"))
+    
+    # Проверяем дополнительные claims безопасности
+    iss = payload.get("iss")
+    jti = payload.get("jti")
+    iat = payload.get("iat")
+    
+    if login is None or user_type is None or user_id is None:
         raise credentials_exception
     
+    # Проверяем issuer
+    if iss != "request_management_system":
+        raise credentials_exception
+    
+    # Проверяем JWT ID (можно использовать для отзыва токенов)
+    if not jti:
+        raise credentials_exception
+    
+    # Проверяем время выдачи токена
+    if not iat or datetime.utcfromtimestamp(iat) > datetime.utcnow():
+        raise credentials_exception
+    
+    token_data = TokenData(login=login, role=user_type, user_id=user_id)
+    
     # Получаем пользователя из соответствующей таблицы
     if user_type == "master":
         result = await db.execute(
@@ -1,23 +1,14 @@
 """
 CORS utilities для динамического управления CORS headers
 """
+from functools import lru_cache
 from typing import Dict, List
 from fastapi.responses import JSONResponse
-from .config import Settings
+from .config import settings
 
-def get_cors_headers(allowed_methods: str = "GET, POST, PUT, DELETE, OPTIONS", 
-                    additional_headers: str = "Content-Type, Authorization") -> Dict[str, str]:
-    """
-    Получить CORS headers на основе текущих настроек
-    
-    Args:
-        allowed_methods: Разрешенные HTTP методы
-        additional_headers: Дополнительные разрешенные заголовки
-    
-    Returns:
-        Словарь с CORS headers
-    """
-    settings = Settings()
+@lru_cache(maxsize=32)
+def _build_cors_headers(allowed_methods: str, additional_headers: str) -> Dict[str, str]:
+    """Собрать CORS headers (набор методов в handlers фиксирован, поэтому кэшируется)"""
     allowed_origins = settings.get_allowed_origins
     
     # Берем первый разрешенный origin для заголовка
@@ -31,6 +22,21 @@ def get_cors_headers(allowed_methods: str = "GET, POST, PUT, DELETE, OPTIONS",
         "Access-Control-Allow-Credentials": "true",
     }
 
+def get_cors_headers(allowed_methods: str = "GET, POST, PUT, DELETE, OPTIONS", 
+                    additional_headers: str = "Content-Type, Authorization") -> Dict[str, str]:
+    """
+    Получить CORS headers на основе текущих настроек
+    
+    Args:
+        allowed_methods: Разрешенные HTTP методы
+        additional_headers: Дополнительные разрешенные заголовки
+    
+    Returns:
+        Словарь с CORS headers
+    """
+    # Копия: вызывающий код может менять словарь, не трогая кэш
+    return dict(_build_cors_headers(allowed_methods, additional_headers))
+
 def create_cors_response(content: dict = {}, 
                         status_code: int = 200,
                         allowed_methods: str = "GET, POST, PUT, DELETE, OPTIONS") -> JSONResponse:
@@ -63,5 +69,4 @@ def get_allowed_origins() -> List[str]:
     Returns:
         Список разрешенных origins
     """
-    settings = Settings()
     return settings.get_allowed_origins 
\ No newline at end of file
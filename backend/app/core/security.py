@@ -121,18 +121,23 @@ class LoginAttemptTracker:
             login_attempts[attempt_key] = {
                 'attempts': [],
                 'locked_until': None,
-                'total_attempts': 0
+                'total_attempts': 0,
+                'failed_attempts': 0  # Неудачные попытки в списке attempts
             }
         
+        attempts_data = login_attempts[attempt_key]
+        
         # Добавляем попытку
-        login_attempts[attempt_key]['attempts'].append({
+        attempts_data['attempts'].append({
             'timestamp': current_time,
             'success': success,
             'user_agent': user_agent,
             'ip_address': ip_address
         })
         
-        login_attempts[attempt_key]['total_attempts'] += 1
+        attempts_data['total_attempts'] += 1
+        if not success:
+            attempts_data['failed_attempts'] += 1
         
         # Логируем попытку
         log_data = {
@@ -149,30 +154,36 @@ class LoginAttemptTracker:
             logger.warning(f"Failed login attempt", extra=log_data)
         
         # Очищаем старые попытки (старше 1 часа)
-        one_hour_ago = current_time - timedelta(hours=1)
-        login_attempts[attempt_key]['attempts'] = [
-            attempt for attempt in login_attempts[attempt_key]['attempts']
-            if attempt['timestamp'] > one_hour_ago
-        ]
+        LoginAttemptTracker._prune_attempts(attempts_data, current_time - timedelta(hours=1))
         
         # Проверяем необходимость блокировки
         if not success:
             LoginAttemptTracker._check_and_apply_lockout(attempt_key, current_time)
     
+    @staticmethod
+    def _prune_attempts(attempts_data: Dict[str, Any], since: datetime):
+        """Удалить попытки старше since, поддерживая счетчик неудачных"""
+        # Попытки добавляются по времени, поэтому устаревшие лежат в начале списка
+        attempts = attempts_data['attempts']
+        expired = 0
+        for attempt in attempts:
+            if attempt['timestamp'] > since:
+                break
+            expired += 1
+            if not attempt['success']:
+                attempts_data['failed_attempts'] -= 1
+        
+        if expired:
+            del attempts[:expired]
+    
     @staticmethod
     def _check_and_apply_lockout(attempt_key: str, current_time: datetime):
         """Проверить и применить блокировку аккаунта"""
         attempts_data = login_attempts[attempt_key]
         
-        # Считаем неудачные попытки за последний час
-        failed_attempts = [
-            attempt for attempt in attempts_data['attempts']
-            if not attempt['success'] and 
-            attempt['timestamp'] > current_time - timedelta(hours=1)
-        ]
-        
-        # Блокируем на 30 минут после 5 неудачных попыток
-        if len(failed_attempts) >= settings.LOGIN_ATTEMPTS_PER_HOUR:
+        # Блокируем на 30 минут после 5 неудачных попыток за последний час;
+        # список попыток уже очищен от старых, счетчик ведется при записи
+        if attempts_data['failed_attempts'] >= settings.LOGIN_ATTEMPTS_PER_HOUR:
             attempts_data['locked_until'] = current_time + timedelta(minutes=30)
             logger.warning(f"Account locked due to too many failed attempts: {attempt_key}")
     
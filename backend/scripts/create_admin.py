@@ -11,7 +11,8 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy import select
+from sqlalchemy.pool import NullPool
+from sqlalchemy import select, exists
 from app.core.models import Administrator, Role
 from app.core.config import settings
 
@@ -26,38 +27,49 @@ def get_password_hash(password: str) -> str:
 
 async def create_administrator():
     """Создание администратора"""
-    # Создаем подключение к базе данных
-    engine = create_async_engine(settings.DATABASE_URL)
+    # Готовый хеш из ADMIN_PASSWORD_HASH позволяет обойтись без bcrypt в скрипте
+    precomputed_hash = os.getenv("ADMIN_PASSWORD_HASH")
+    if precomputed_hash and not pwd_context.identify(precomputed_hash, required=False):
+        print("❌ ADMIN_PASSWORD_HASH не является bcrypt хешем!")
+        return
+    
+    # Создаем подключение к базе данных; скрипту нужно одно соединение, пул не нужен
+    engine = create_async_engine(settings.DATABASE_URL, poolclass=NullPool)
+    
+    admin_password = os.getenv("ADMIN_PASSWORD", "CHANGE_ME_NOW")  # Используем переменную окружения
     
     async with engine.begin() as conn:
         # Создаем сессию
         async_session = AsyncSession(conn)
         
         try:
-            # Проверяем, существует ли роль admin
-            result = await async_session.execute(select(Role).where(Role.name == "admin"))
-            admin_role = result.scalar_one_or_none()
+            # Роль admin и наличие администратора проверяем одним запросом
+            result = await async_session.execute(
+                select(
+                    select(Role.id).where(Role.name == "admin").scalar_subquery(),
+                    exists().where(Administrator.login == "admin"),
+                )
+            )
+            admin_role_id, admin_exists = result.one()
             
-            if not admin_role:
+            if admin_role_id is None:
                 print("❌ Роль 'admin' не найдена в таблице roles!")
                 print("Убедитесь, что база данных инициализирована корректно.")
                 return
             
-            # Проверяем, существует ли уже администратор
-            result = await async_session.execute(select(Administrator).where(Administrator.login == "admin"))
-            existing_admin = result.scalar_one_or_none()
-            
-            if existing_admin:
+            if admin_exists:
                 print("❌ Администратор с логином 'admin' уже существует!")
                 return
             
-            # Создаем нового администратора
-            admin_password = os.getenv("ADMIN_PASSWORD", "CHANGE_ME_NOW")  # Используем переменную окружения
-            hashed_password = get_password_hash(admin_password)
+            # Создаем нового администратора; bcrypt считается только после проверок
+            # и в пуле потоков, чтобы не блокировать event loop с открытым соединением
+            hashed_password = precomputed_hash or await asyncio.get_running_loop().run_in_executor(
+                None, get_password_hash, admin_password
+            )
             
             new_admin = Administrator(
                 name="Главный Администратор",
-                role_id=admin_role.id,
+                role_id=admin_role_id,
                 status="active",
                 login="admin",
                 password_hash=hashed_password,
@@ -69,7 +81,10 @@ async def create_administrator():
             
             print("✅ Администратор успешно создан!")
             print(f"📋 Логин: admin")
-            print(f"🔑 Пароль: {admin_password}")
+            if precomputed_hash:
+                print("🔑 Пароль: задан хешем из ADMIN_PASSWORD_HASH")
+            else:
+                print(f"🔑 Пароль: {admin_password}")
             print(f"👤 Имя: {new_admin.name}")
             print(f"🔐 Роль: admin")
             print(f"📝 Статус: {new_admin.status}")
@@ -1,15 +1,29 @@
 import pytest
 import asyncio
+import time
 from typing import AsyncGenerator
+import httpx
 from fastapi.testclient import TestClient
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.pool import StaticPool
-from sqlalchemy import text
-from unittest.mock import AsyncMock, MagicMock
+from starlette.responses import JSONResponse
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine, AsyncSession, AsyncConnection, create_async_engine, async_sessionmaker
+)
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+from sqlalchemy import event, text, insert, select
+from sqlalchemy.exc import OperationalError
+from unittest.mock import AsyncMock, MagicMock, patch
+from passlib.context import CryptContext
 import os
+import sys
+import functools
 from decimal import Decimal
 from datetime import datetime, date
 
+# uvloop закреплен в requirements для всех платформ, кроме Windows
+if sys.platform != "win32":
+    import uvloop
+
 from app.core.config import settings
 from app.core.database import Base, get_db
 from app.core.models import (
@@ -17,36 +31,221 @@ from app.core.models import (
     Request, Transaction, RequestType, Direction, 
     AdvertisingCampaign, TransactionType, File
 )
-from app.core.auth import get_password_hash
+from app.core.auth import get_password_hash, pwd_context
 from app.main import app
 
-# Создаем тестовую базу данных в памяти
-TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+# Минимальная стоимость bcrypt (2^4 раундов вместо 2^12): формат хеша "$2b$"
+# и проверка пароля те же, а каждый хеш в тестах считается в сотни раз быстрее
+pwd_context.update(bcrypt__rounds=4)
+
+# Быстрая схема для тестов, которым важны только проверка пароля и различие
+# хешей, а не сам bcrypt. bcrypt оставлен вторым, чтобы его хеши тоже проверялись
+FAST_PWD_CONTEXT = CryptContext(
+    schemes=["pbkdf2_sha256", "bcrypt"], deprecated="auto", pbkdf2_sha256__rounds=1
+)
+
+
+@functools.lru_cache(maxsize=None)
+def cached_password_hash(password: str) -> str:
+    """Хеш пароля тестового пользователя; bcrypt считается один раз за сессию"""
+    return get_password_hash(password)
 
-test_engine = create_async_engine(
-    TEST_DATABASE_URL,
-    poolclass=StaticPool,
-    connect_args={"check_same_thread": False},
-    echo=False  # Отключаем логирование для тестов
+# Пароли, которые тесты хешируют и проверяют; хеш каждого считается один раз за сессию
+KNOWN_PASSWORDS = (
+    "test_password_123", "secure_password_123", "password1", "password2",
+    # Слабые пароли
+    "123", "password", "12345678", "qwerty", "admin",
+    # Сильные пароли
+    "MyStrongPassword123!", "Complex@Pass1", "Secure#Password456", "Strong$Pass789",
 )
 
+# По умолчанию тестовая база данных в памяти; TEST_DATABASE_URL позволяет
+# прогонять тесты на Postgres через PgBouncer (deployment/docker-compose.test.yml)
+TEST_BASE_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+TEST_DATABASE_URL = TEST_BASE_DATABASE_URL
+
+# Под pytest-xdist SQLite в памяти изолирован процессом воркера, а на Postgres
+# каждый воркер работает в своей базе: test_db_gw0, test_db_gw1, ...
+XDIST_WORKER = os.getenv("PYTEST_XDIST_WORKER")
+TEST_WORKER_DATABASE = None
+if XDIST_WORKER and not TEST_BASE_DATABASE_URL.startswith("sqlite"):
+    base_url = make_url(TEST_BASE_DATABASE_URL)
+    TEST_WORKER_DATABASE = f"{base_url.database}_{XDIST_WORKER}"
+    TEST_DATABASE_URL = base_url.set(database=TEST_WORKER_DATABASE).render_as_string(
+        hide_password=False
+    )
+
+# Столько запросов тесты производительности выполняют одновременно;
+# пул соединений тестовой БД не должен быть меньше
+TEST_CONCURRENCY = 10
+
+if TEST_DATABASE_URL.startswith("sqlite"):
+    test_engine_options = {
+        "poolclass": StaticPool,
+        "connect_args": {"check_same_thread": False},
+    }
+else:
+    # PgBouncer в transaction-режиме не поддерживает prepared statements asyncpg.
+    # Пул воркера рассчитан на TEST_CONCURRENCY одновременных запросов, а реальные
+    # соединения Postgres мультиплексирует PgBouncer
+    test_engine_options = {
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": TEST_CONCURRENCY,
+        "max_overflow": 0,
+        # Без пинга и пересоздания соединений посреди замеров
+        "pool_pre_ping": False,
+        "pool_recycle": -1,
+        "connect_args": {"statement_cache_size": 0},
+    }
+
+
+def _sqlite_connect(dbapi_connection, connection_record):
+    """Выключает автоматический BEGIN pysqlite и включает внешние ключи"""
+    dbapi_connection.isolation_level = None
+    dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+
+def _sqlite_begin(conn):
+    """Открывает транзакцию SQLite явно"""
+    conn.exec_driver_sql("BEGIN")
+
+
+def make_test_engine() -> AsyncEngine:
+    """Движок тестовой БД с настройками пула и обработчиками транзакций SQLite"""
+    engine = create_async_engine(
+        TEST_DATABASE_URL,
+        echo=False,  # Отключаем логирование для тестов
+        query_cache_size=1200,  # Кеш скомпилированных запросов с запасом на все тесты
+        **test_engine_options
+    )
+    if TEST_DATABASE_URL.startswith("sqlite"):
+        # pysqlite сам управляет BEGIN и ломает SAVEPOINT; транзакции открываем явно.
+        # Внешние ключи в SQLite по умолчанию выключены, включаем их как в Postgres
+        event.listen(engine.sync_engine, "connect", _sqlite_connect)
+        event.listen(engine.sync_engine, "begin", _sqlite_begin)
+    return engine
+
+
+test_engine = make_test_engine()
+
+# Данные модуля (seeded_connection) не должны зависеть от db_session, который
+# пересоздает схему на test_engine. SQLite в памяти на отдельном движке - это
+# отдельная база; в Postgres база общая, поэтому схема модуля создается в своей
+# namespace внутри транзакции модуля (SEED_SCHEMA)
+if TEST_DATABASE_URL.startswith("sqlite"):
+    seed_engine = make_test_engine()
+else:
+    seed_engine = test_engine
+SEED_SCHEMA = "test_seed"
+
 TestingSessionLocal = async_sessionmaker(
     test_engine, class_=AsyncSession, expire_on_commit=False
 )
 
+# Справочники заполняются одним bulk INSERT на таблицу
+REFERENCE_CITIES = [{"name": "Тестовый город"}]
+REFERENCE_ROLES = [{"name": "callcenter"}, {"name": "admin"}, {"name": "master"}]
+REFERENCE_REQUEST_TYPES = [{"name": "Тестовый тип"}]
+REFERENCE_DIRECTIONS = [{"name": "Тестовое направление"}]
+REFERENCE_TRANSACTION_TYPES = [{"name": "Тестовый тип транзакции"}]
+
+APP_STARTUP_TIME = pytest.StashKey[float]()
+
+REFERENCE_TABLES = {
+    "cities": (City, REFERENCE_CITIES),
+    "roles": (Role, REFERENCE_ROLES),
+    "request_types": (RequestType, REFERENCE_REQUEST_TYPES),
+    "directions": (Direction, REFERENCE_DIRECTIONS),
+    "transaction_types": (TransactionType, REFERENCE_TRANSACTION_TYPES),
+}
+
+
+@pytest.fixture(scope="session")
+def event_loop_policy() -> asyncio.AbstractEventLoopPolicy:
+    """Политика event loop: uvloop везде, кроме Windows"""
+    # pytest-asyncio >= 0.23 берет политику из этой фикстуры сам
+    if sys.platform == "win32":
+        return asyncio.DefaultEventLoopPolicy()
+    return uvloop.EventLoopPolicy()
+
 
 @pytest.fixture(scope="session")
-def event_loop():
+def event_loop(event_loop_policy: asyncio.AbstractEventLoopPolicy):
     """Создает event loop для всей сессии тестирования"""
-    loop = asyncio.new_event_loop()
+    loop = event_loop_policy.new_event_loop()
     asyncio.set_event_loop(loop)
     yield loop
     loop.close()
 
 
+async def create_worker_database():
+    """Создает базу воркера pytest-xdist на Postgres, если её еще нет"""
+    admin_engine = create_async_engine(
+        TEST_BASE_DATABASE_URL, isolation_level="AUTOCOMMIT", **test_engine_options
+    )
+    try:
+        async with admin_engine.connect() as conn:
+            exists = await conn.scalar(
+                text("SELECT 1 FROM pg_database WHERE datname = :name"),
+                {"name": TEST_WORKER_DATABASE},
+            )
+            if not exists:
+                await conn.execute(text(f'CREATE DATABASE "{TEST_WORKER_DATABASE}"'))
+    finally:
+        await admin_engine.dispose()
+
+
+@pytest.fixture(scope="session")
+async def database_available() -> bool:
+    """Проверяет доступность тестовой БД один раз на сессию"""
+    try:
+        if TEST_WORKER_DATABASE is not None:
+            await create_worker_database()
+        async with test_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except (OperationalError, OSError):
+        return False
+    return True
+
+
+@pytest.fixture(scope="session", autouse=True)
+async def warm_statement_cache(database_available: bool):
+    """Прогревает кеш скомпилированных запросов SQLAlchemy один раз на сессию"""
+    if not database_available:
+        return
+    
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        for model in (City, Master, Request, Transaction, RequestType, TransactionType):
+            await conn.execute(select(model).limit(1))
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest.fixture(scope="session", autouse=True)
+async def warm_connection_pool(database_available: bool):
+    """Заранее открывает все соединения пула, чтобы тесты не платили за подключение"""
+    # StaticPool SQLite держит единственное соединение, прогревать нечего
+    if not database_available or TEST_DATABASE_URL.startswith("sqlite"):
+        return
+    
+    connections = await asyncio.gather(*(test_engine.connect() for _ in range(TEST_CONCURRENCY)))
+    await asyncio.gather(*(conn.execute(text("SELECT 1")) for conn in connections))
+    await asyncio.gather(*(conn.close() for conn in connections))
+
+
+@pytest.fixture(scope="session")
+def session_factory() -> async_sessionmaker:
+    """Фабрика сессий тестовой БД для тестов, которым нужны независимые сессии"""
+    return TestingSessionLocal
+
+
 @pytest.fixture
-async def db_session() -> AsyncGenerator[AsyncSession, None]:
+async def db_session(database_available: bool) -> AsyncGenerator[AsyncSession, None]:
     """Создает сессию базы данных для тестирования"""
+    # Без БД тест пропускается сразу, а не ждет таймаута подключения
+    if not database_available:
+        pytest.skip("Тестовая БД недоступна")
+    
     async with test_engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     
@@ -61,6 +260,69 @@ async def db_session() -> AsyncGenerator[AsyncSession, None]:
         await conn.run_sync(Base.metadata.drop_all)
 
 
+@pytest.fixture(scope="module")
+async def seeded_connection(database_available: bool) -> AsyncGenerator[AsyncConnection, None]:
+    """Соединение с открытой транзакцией: схема и справочники создаются один раз на модуль"""
+    if not database_available:
+        pytest.skip("Тестовая БД недоступна")
+    
+    async with seed_engine.connect() as conn:
+        transaction = await conn.begin()
+        if conn.dialect.name == "postgresql":
+            # Таблицы модуля в своей схеме не пересекаются с таблицами db_session;
+            # откат транзакции удаляет и схему
+            await conn.execute(text(f'CREATE SCHEMA "{SEED_SCHEMA}"'))
+            await conn.execute(text(f'SET LOCAL search_path TO "{SEED_SCHEMA}"'))
+        await conn.run_sync(Base.metadata.create_all)
+        for model, rows in REFERENCE_TABLES.values():
+            await conn.execute(insert(model), rows)
+        try:
+            yield conn
+        finally:
+            await transaction.rollback()
+
+
+@pytest.fixture(scope="module")
+async def seeded_ids(seeded_connection: AsyncConnection) -> dict:
+    """ID справочников из seeded_connection: {"cities": {"Тестовый город": 1}, ...}"""
+    ids = {}
+    for key, (model, _) in REFERENCE_TABLES.items():
+        result = await seeded_connection.execute(select(model.name, model.id))
+        ids[key] = dict(result.all())
+    return ids
+
+
+@pytest.fixture
+async def nested_session(seeded_connection: AsyncConnection) -> AsyncGenerator[AsyncSession, None]:
+    """Сессия внутри SAVEPOINT, который откатывается после теста"""
+    savepoint = await seeded_connection.begin_nested()
+    session = AsyncSession(
+        bind=seeded_connection,
+        join_transaction_mode="create_savepoint",
+        expire_on_commit=False,
+    )
+    try:
+        yield session
+    finally:
+        await session.close()
+        await savepoint.rollback()
+
+
+@pytest.fixture
+async def reference_data(db_session: AsyncSession) -> dict:
+    """Заполняет справочники bulk INSERT'ом вместо add/commit на каждую запись"""
+    async def bulk_insert(model, rows):
+        result = await db_session.scalars(insert(model).returning(model), rows)
+        return {obj.name: obj for obj in result.all()}
+    
+    data = {
+        key: await bulk_insert(model, rows)
+        for key, (model, rows) in REFERENCE_TABLES.items()
+    }
+    await db_session.commit()
+    return data
+
+
 @pytest.fixture
 def client():
     """Создает тестового клиента FastAPI"""
@@ -68,20 +330,90 @@ def client():
         yield test_client
 
 
+@pytest.fixture(scope="session")
+def session_client(pytestconfig):
+    """Один клиент FastAPI на всю сессию для запросов без состояния"""
+    start_time = time.perf_counter()
+    with TestClient(app) as test_client:
+        # Запуск приложения (lifespan) происходит один раз, здесь же его и замеряем
+        pytestconfig.stash[APP_STARTUP_TIME] = time.perf_counter() - start_time
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def app_startup_time(session_client: TestClient, pytestconfig) -> float:
+    """Время запуска приложения, замеренное при создании session_client"""
+    return pytestconfig.stash[APP_STARTUP_TIME]
+
+
 @pytest.fixture
-async def authenticated_client(db_session: AsyncSession):
+def fast_pwd_context(monkeypatch) -> CryptContext:
+    """Подменяет bcrypt в get_password_hash/verify_password на pbkdf2_sha256 в один раунд"""
+    monkeypatch.setattr("app.core.auth.pwd_context", FAST_PWD_CONTEXT)
+    return FAST_PWD_CONTEXT
+
+
+@pytest.fixture(scope="session")
+def hashed_passwords() -> dict:
+    """Хеши KNOWN_PASSWORDS в быстрой схеме; проверять их нужно с fast_pwd_context"""
+    # Хеши считает сам get_password_hash приложения, подмена та же, что в fast_pwd_context
+    with patch("app.core.auth.pwd_context", FAST_PWD_CONTEXT):
+        return {password: get_password_hash(password) for password in KNOWN_PASSWORDS}
+
+
+@pytest.fixture(scope="session")
+def asgi_transport() -> httpx.ASGITransport:
+    """Один ASGI-транспорт на сессию: запросы идут прямо в приложение, без потоков TestClient"""
+    return httpx.ASGITransport(app=app)
+
+
+@pytest.fixture(scope="module")
+async def async_client(asgi_transport: httpx.ASGITransport) -> AsyncGenerator[httpx.AsyncClient, None]:
+    """Асинхронный клиент поверх общего ASGI-транспорта: один event loop, без потоков и lifespan"""
+    async with httpx.AsyncClient(
+        transport=asgi_transport, base_url="http://test", follow_redirects=True
+    ) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def concurrency() -> int:
+    """Число одновременных запросов в тестах производительности"""
+    return TEST_CONCURRENCY
+
+
+@pytest.fixture
+def csrf_token(client: TestClient) -> str:
+    """CSRF токен, привязанный к сессии client: отправлять его нужно тем же клиентом"""
+    response = client.get("/api/v1/auth/csrf-token")
+    assert response.status_code == 200
+    return response.json()["csrf_token"]
+
+
+@pytest.fixture(scope="session")
+def health_response(session_client: TestClient):
+    """Ответ /health, запрошенный один раз для проверок статуса и заголовков"""
+    return session_client.get("/health")
+
+
+@pytest.fixture(scope="session")
+def openapi_schema() -> bytes:
+    """OpenAPI схема в том виде, в каком её отдает /openapi.json; генерируется один раз"""
+    # app.openapi() кеширует схему в app.openapi_schema
+    return JSONResponse(app.openapi()).body
+
+
+@pytest.fixture
+async def authenticated_client(db_session: AsyncSession, reference_data: dict):
     """Создает аутентифицированного клиента"""
     # Создаем тестового пользователя
-    role = Role(name="callcenter")
-    db_session.add(role)
-    await db_session.commit()
-    await db_session.refresh(role)
+    role = reference_data["roles"]["callcenter"]
     
     employee = Employee(
         name="Test User",
         phone="1234567890",
         role_id=role.id,
-        password_hash=get_password_hash("testpassword")
+        password_hash=cached_password_hash("testpassword")
     )
     db_session.add(employee)
     await db_session.commit()
@@ -110,67 +442,39 @@ async def authenticated_client(db_session: AsyncSession):
 
 
 @pytest.fixture
-async def test_city(db_session: AsyncSession):
-    """Создает тестовый город"""
-    city = City(name="Тестовый город")
-    db_session.add(city)
-    await db_session.commit()
-    await db_session.refresh(city)
-    return city
+async def test_city(reference_data: dict):
+    """Возвращает тестовый город"""
+    return reference_data["cities"]["Тестовый город"]
 
 
 @pytest.fixture
-async def test_role(db_session: AsyncSession):
-    """Создает тестовую роль"""
-    role = Role(name="callcenter")
-    db_session.add(role)
-    await db_session.commit()
-    await db_session.refresh(role)
-    return role
+async def test_role(reference_data: dict):
+    """Возвращает тестовую роль"""
+    return reference_data["roles"]["callcenter"]
 
 
 @pytest.fixture
-async def test_admin_role(db_session: AsyncSession):
-    """Создает роль администратора"""
-    role = Role(name="admin")
-    db_session.add(role)
-    await db_session.commit()
-    await db_session.refresh(role)
-    return role
+async def test_admin_role(reference_data: dict):
+    """Возвращает роль администратора"""
+    return reference_data["roles"]["admin"]
 
 
 @pytest.fixture
-async def test_master_role(db_session: AsyncSession):
-    """Создает роль мастера"""
-    role = Role(name="master")
-    db_session.add(role)
-    await db_session.commit()
-    await db_session.refresh(role)
-    return role
+async def test_master_role(reference_data: dict):
+    """Возвращает роль мастера"""
+    return reference_data["roles"]["master"]
 
 
 @pytest.fixture
-async def test_request_type(db_session: AsyncSession):
-    """Создает тестовый тип заявки"""
-    request_type = RequestType(
-        name="Тестовый тип",
-        description="Описание тестового типа",
-        price=Decimal("100.00")
-    )
-    db_session.add(request_type)
-    await db_session.commit()
-    await db_session.refresh(request_type)
-    return request_type
+async def test_request_type(reference_data: dict):
+    """Возвращает тестовый тип заявки"""
+    return reference_data["request_types"]["Тестовый тип"]
 
 
 @pytest.fixture
-async def test_direction(db_session: AsyncSession):
-    """Создает тестовое направление"""
-    direction = Direction(name="Тестовое направление")
-    db_session.add(direction)
-    await db_session.commit()
-    await db_session.refresh(direction)
-    return direction
+async def test_direction(reference_data: dict):
+    """Возвращает тестовое направление"""
+    return reference_data["directions"]["Тестовое направление"]
 
 
 @pytest.fixture
@@ -190,16 +494,9 @@ async def test_advertising_campaign(db_session: AsyncSession):
 
 
 @pytest.fixture
-async def test_transaction_type(db_session: AsyncSession):
-    """Создает тестовый тип транзакции"""
-    transaction_type = TransactionType(
-        name="Тестовый тип транзакции",
-        description="Описание тестового типа транзакции"
-    )
-    db_session.add(transaction_type)
-    await db_session.commit()
-    await db_session.refresh(transaction_type)
-    return transaction_type
+async def test_transaction_type(reference_data: dict):
+    """Возвращает тестовый тип транзакции"""
+    return reference_data["transaction_types"]["Тестовый тип транзакции"]
 
 
 @pytest.fixture
@@ -209,7 +506,7 @@ async def test_employee(db_session: AsyncSession, test_role: Role):
         name="Тестовый сотрудник",
         phone="1234567890",
         role_id=test_role.id,
-        password_hash=get_password_hash("testpassword")
+        password_hash=cached_password_hash("testpassword")
     )
     db_session.add(employee)
     await db_session.commit()
@@ -224,7 +521,7 @@ async def test_administrator(db_session: AsyncSession, test_admin_role: Role):
         name="Тестовый администратор",
         phone="0987654321",
         role_id=test_admin_role.id,
-        password_hash=get_password_hash("adminpassword")
+        password_hash=cached_password_hash("adminpassword")
     )
     db_session.add(admin)
     await db_session.commit()
@@ -239,7 +536,7 @@ async def test_master(db_session: AsyncSession, test_master_role: Role, test_cit
         name="Тестовый мастер",
         phone="1111111111",
         role_id=test_master_role.id,
-        password_hash=get_password_hash("masterpassword"),
+        password_hash=cached_password_hash("masterpassword"),
         city_id=test_city.id
     )
     db_session.add(master)
@@ -3,34 +3,67 @@
 Покрывают полные пользовательские сценарии
 """
 import pytest
+import httpx
 from fastapi.testclient import TestClient
 from sqlalchemy.ext.asyncio import AsyncSession
 from decimal import Decimal
-from datetime import date
-from unittest.mock import patch, AsyncMock
+from unittest.mock import create_autospec
 
+import app.utils.file_security as file_security
 from app.core.models import (
     City, Role, Master, Employee, Administrator, 
     Request, Transaction, RequestType, TransactionType, File
 )
 
+# Содержимое загружаемых файлов создается один раз на модуль
+_TEST_RECEIPT = b"Test file content"
+# Исполняемый файл (заголовок PE), замаскированный под изображение
+_TEST_MALICIOUS = b"MZ\x90\x00\x03\x00\x00\x00Malicious content"
+
+# Общая часть тела заявки; конкретные id справочников добавляются в тестах
+_BASE_REQUEST = {
+    "client_phone": "+79991234567",
+    "client_name": "Тестовый клиент",
+    "address": "Тестовый адрес",
+    "problem": "Тестовая проблема",
+    "result": 1500.00,
+    "expenses": 300.00,
+    "net_amount": 1200.00,
+    "master_handover": 800.00
+}
+
+# Фиксированная дата транзакций: тест не зависит от текущего дня, а часы не
+# замораживаются, иначе токен authenticated_client оказался бы выписан "в будущем"
+_TRANSACTION_DATE = "2024-01-15"
+
+
+def _encode_multipart(files: dict) -> tuple[bytes, dict]:
+    """Кодирует multipart-тело один раз; возвращает тело и заголовки для отправки"""
+    request = httpx.Request("POST", "http://testserver", files=files)
+    return request.read(), {"Content-Type": request.headers["Content-Type"]}
+
+
+# Готовые multipart-тела переиспользуются без повторного кодирования
+_RECEIPT_UPLOAD = _encode_multipart({"file": ("test_receipt.jpg", _TEST_RECEIPT, "image/jpeg")})
+_BSO_UPLOAD = _encode_multipart({"file": ("test_bso.pdf", _TEST_RECEIPT, "application/pdf")})
+# Разрешенное расширение, чтобы загрузка дошла до проверки MIME типа
+_MALICIOUS_UPLOAD = _encode_multipart(
+    {"file": ("malicious.jpg", _TEST_MALICIOUS, "image/jpeg")}
+)
+
 
-@pytest.mark.asyncio
 class TestAuthenticationFlow:
     """Тесты полного процесса аутентификации"""
     
-    async def test_complete_login_flow(self, client: TestClient, test_employee: Employee):
+    async def test_complete_login_flow(
+        self, client: TestClient, test_employee: Employee, csrf_token: str
+    ):
         """Тест полного процесса входа в систему"""
         # 1. Попытка доступа без авторизации
         response = client.get("/api/v1/requests/")
         assert response.status_code == 401
         
-        # 2. Получение CSRF токена
-        csrf_response = client.get("/api/v1/auth/csrf-token")
-        assert csrf_response.status_code == 200
-        csrf_token = csrf_response.json()["csrf_token"]
-        
-        # 3. Успешный вход
+        # 2. Успешный вход с CSRF токеном сессии
         login_response = client.post("/api/v1/auth/login", 
             json={
                 "login": test_employee.login,
@@ -45,7 +78,7 @@ class TestAuthenticationFlow:
         assert data["token_type"] == "bearer"
         assert data["user_type"] == "employee"
         
-        # 4. Доступ к защищенному ресурсу
+        # 3. Доступ к защищенному ресурсу
         token = data["access_token"]
         protected_response = client.get("/api/v1/requests/",
             headers={"Authorization": f"Bearer {token}"}
@@ -92,7 +125,6 @@ class TestAuthenticationFlow:
         assert response.status_code == 401
 
 
-@pytest.mark.asyncio
 class TestRequestsWorkflow:
     """Тесты полного жизненного цикла заявок"""
     
@@ -121,18 +153,10 @@ class TestRequestsWorkflow:
         assert len(masters) > 0
         
         # 2. Создание заявки
-        request_data = {
+        request_data = _BASE_REQUEST | {
             "city_id": test_city.id,
             "request_type_id": test_request_type.id,
-            "master_id": test_master.id,
-            "client_phone": "+79991234567",
-            "client_name": "Тестовый клиент",
-            "address": "Тестовый адрес",
-            "problem": "Тестовая проблема",
-            "result": 1500.00,
-            "expenses": 300.00,
-            "net_amount": 1200.00,
-            "master_handover": 800.00
+            "master_id": test_master.id
         }
         
         create_response = authenticated_client.post("/api/v1/requests/", json=request_data)
@@ -226,7 +250,6 @@ class TestRequestsWorkflow:
             assert response.status_code == 403
 
 
-@pytest.mark.asyncio
 class TestTransactionsWorkflow:
     """Тесты работы с транзакциями"""
     
@@ -244,7 +267,7 @@ class TestTransactionsWorkflow:
             "transaction_type_id": test_transaction_type.id,
             "master_id": test_master.id,
             "amount": 1000.00,
-            "specified_date": str(date.today()),
+            "specified_date": _TRANSACTION_DATE,
             "description": "Тестовая транзакция"
         }
         
@@ -255,12 +278,8 @@ class TestTransactionsWorkflow:
         assert created_transaction["amount"] == 1000.00
         assert created_transaction["description"] == "Тестовая транзакция"
         
-        # Получение транзакции
+        # Обновление транзакции (ответ на создание уже содержит все поля)
         transaction_id = created_transaction["id"]
-        response = authenticated_client.get(f"/api/v1/transactions/{transaction_id}")
-        assert response.status_code == 200
-        
-        # Обновление транзакции
         update_data = {
             "amount": 1500.00,
             "description": "Обновленная транзакция"
@@ -297,7 +316,6 @@ class TestTransactionsWorkflow:
         assert len(transactions) > 0
 
 
-@pytest.mark.asyncio
 class TestFileUploadWorkflow:
     """Тесты загрузки файлов"""
     
@@ -307,14 +325,12 @@ class TestFileUploadWorkflow:
         test_request: Request
     ):
         """Тест загрузки файлов"""
-        # Создаем тестовый файл
-        test_file_content = b"Test file content"
-        
         # Загружаем файл как чек расходов
-        files = {"file": ("test_receipt.jpg", test_file_content, "image/jpeg")}
+        body, headers = _RECEIPT_UPLOAD
         response = authenticated_client.post(
             f"/api/v1/files/upload-expense-receipt/{test_request.id}",
-            files=files
+            content=body,
+            headers=headers
         )
         assert response.status_code == 200
         
@@ -323,60 +339,70 @@ class TestFileUploadWorkflow:
         assert "file_size" in file_info
         
         # Загружаем файл как БСО
-        files = {"file": ("test_bso.pdf", test_file_content, "application/pdf")}
+        body, headers = _BSO_UPLOAD
         response = authenticated_client.post(
             f"/api/v1/files/upload-bso/{test_request.id}",
-            files=files
+            content=body,
+            headers=headers
         )
         assert response.status_code == 200
     
-    @patch('app.utils.file_security.validate_file_content')
     async def test_file_security_validation(
         self,
-        mock_validate,
-        authenticated_client: TestClient,
-        test_request: Request
+        monkeypatch: pytest.MonkeyPatch,
+        authenticated_client: TestClient
     ):
         """Тест валидации безопасности файлов"""
-        # Мокаем валидацию как неуспешную
-        mock_validate.return_value = False
+        # Мокаем валидацию как неуспешную; autospec проверяет сигнатуру вызова
+        mock_validate = create_autospec(
+            file_security.validate_mime_type,
+            side_effect=file_security.FileSecurityError(
+                "Файл не прошел проверку безопасности"
+            )
+        )
+        monkeypatch.setattr(file_security, "validate_mime_type", mock_validate)
         
-        malicious_file = b"Malicious content"
-        files = {"file": ("malicious.exe", malicious_file, "application/x-executable")}
+        body, headers = _MALICIOUS_UPLOAD
         
+        # Загрузка чека обслуживается роутером files (app/api/files.py)
         response = authenticated_client.post(
-            f"/api/v1/files/upload-expense-receipt/{test_request.id}",
-            files=files
+            "/api/upload-expense-receipt/",
+            content=body,
+            headers=headers
         )
         assert response.status_code == 400
         assert "не прошел проверку безопасности" in response.json()["detail"]
+        mock_validate.assert_called_once()
 
 
-@pytest.mark.asyncio
 class TestHealthAndMonitoring:
     """Тесты системы мониторинга и здоровья"""
     
-    async def test_health_check_workflow(self, client: TestClient):
+    @pytest.mark.xdist_group("readonly")
+    async def test_health_check_workflow(self, session_client: TestClient, health_response):
         """Тест проверки здоровья системы"""
         # Базовая проверка здоровья
-        response = client.get("/health")
-        assert response.status_code == 200
+        assert health_response.status_code == 200
         
-        health_data = response.json()
+        health_data = health_response.json()
         assert "status" in health_data
         assert "timestamp" in health_data
         
         # Детальная проверка здоровья (требует авторизации)
-        response = client.get("/api/v1/health/detailed")
+        response = session_client.get("/api/v1/health/detailed")
         assert response.status_code == 401  # Без авторизации
     
-    async def test_metrics_collection(self, admin_client: TestClient):
+    @pytest.fixture
+    def metrics_response(self, admin_client: TestClient):
+        """Ответ /api/v1/metrics/ (только для админа), общий для проверок метрик"""
+        return admin_client.get("/api/v1/metrics/")
+    
+    @pytest.mark.slow
+    async def test_metrics_collection(self, metrics_response):
         """Тест сбора метрик"""
-        # Получение метрик (только для админа)
-        response = admin_client.get("/api/v1/metrics/")
-        assert response.status_code == 200
+        assert metrics_response.status_code == 200
         
-        metrics = response.json()
+        metrics = metrics_response.json()
         assert "system_metrics" in metrics
         assert "business_metrics" in metrics
         
@@ -390,11 +416,12 @@ class TestHealthAndMonitoring:
         assert "transactions_total" in business_metrics
 
 
-@pytest.mark.asyncio
 class TestSecurityFeatures:
     """Тесты функций безопасности"""
     
-    async def test_csrf_protection(self, client: TestClient, test_employee: Employee):
+    async def test_csrf_protection(
+        self, client: TestClient, test_employee: Employee, csrf_token: str
+    ):
         """Тест CSRF защиты"""
         # Попытка входа без CSRF токена
         response = client.post("/api/v1/auth/login", json={
@@ -404,11 +431,6 @@ class TestSecurityFeatures:
         # В зависимости от настроек может быть 200 или 403
         assert response.status_code in [200, 403]
         
-        # Получение CSRF токена
-        csrf_response = client.get("/api/v1/auth/csrf-token")
-        assert csrf_response.status_code == 200
-        
-        csrf_token = csrf_response.json()["csrf_token"]
         assert csrf_token is not None
         
         # Вход с CSRF токеном
@@ -433,13 +455,13 @@ class TestSecurityFeatures:
         success_count = sum(1 for status in responses if status == 200)
         assert success_count > 10  # Большинство должно пройти
     
-    async def test_secure_headers(self, client: TestClient):
+    @pytest.mark.xdist_group("readonly")
+    async def test_secure_headers(self, health_response):
         """Тест заголовков безопасности"""
-        response = client.get("/health")
-        assert response.status_code == 200
+        assert health_response.status_code == 200
         
         # Проверяем наличие заголовков безопасности
-        headers = response.headers
+        headers = health_response.headers
         assert "X-Content-Type-Options" in headers
         assert "X-Frame-Options" in headers
         assert "Content-Security-Policy" in headers
@@ -449,7 +471,6 @@ class TestSecurityFeatures:
         assert headers["X-Frame-Options"] == "DENY"
 
 
-@pytest.mark.asyncio
 class TestErrorHandling:
     """Тесты обработки ошибок"""
     
@@ -469,32 +490,31 @@ class TestErrorHandling:
         assert "detail" in error_data
         assert isinstance(error_data["detail"], list)
     
-    async def test_not_found_errors(self, authenticated_client: TestClient):
-        """Тест ошибок 404"""
-        # Попытка получить несуществующую заявку
-        response = authenticated_client.get("/api/v1/requests/99999")
-        assert response.status_code == 404
-        
-        # Попытка обновить несуществующую заявку
-        response = authenticated_client.put("/api/v1/requests/99999", json={"status": "completed"})
+    @pytest.mark.parametrize("method,body", [
+        ("GET", None),
+        ("PUT", {"status": "completed"}),
+    ])
+    async def test_not_found_errors(self, authenticated_client: TestClient, method, body):
+        """Тест ошибок 404 для несуществующей заявки"""
+        response = authenticated_client.request(method, "/api/v1/requests/99999", json=body)
         assert response.status_code == 404
     
-    async def test_permission_errors(self, master_client: TestClient):
-        """Тест ошибок доступа"""
+    @pytest.mark.parametrize("method,url,body", [
         # Мастер пытается получить метрики (только для админа)
-        response = master_client.get("/api/v1/metrics/")
-        assert response.status_code == 403
-        
+        ("GET", "/api/v1/metrics/", None),
         # Мастер пытается создать пользователя
-        response = master_client.post("/api/v1/users/", json={
+        ("POST", "/api/v1/users/", {
             "name": "Новый пользователь",
             "login": "new_user",
             "password": "password123"
-        })
+        }),
+    ])
+    async def test_permission_errors(self, master_client: TestClient, method, url, body):
+        """Тест ошибок доступа"""
+        response = master_client.request(method, url, json=body)
         assert response.status_code == 403
 
 
-@pytest.mark.asyncio
 class TestDatabaseIntegration:
     """Тесты интеграции с базой данных"""
     
@@ -507,18 +527,10 @@ class TestDatabaseIntegration:
     ):
         """Тест транзакций базы данных"""
         # Создание нескольких связанных записей
-        request_data = {
+        request_data = _BASE_REQUEST | {
             "city_id": test_city.id,
             "request_type_id": test_request_type.id,
-            "master_id": test_master.id,
-            "client_phone": "+79991234567",
-            "client_name": "Тестовый клиент",
-            "address": "Тестовый адрес",
-            "problem": "Тестовая проблема",
-            "result": 1500.00,
-            "expenses": 300.00,
-            "net_amount": 1200.00,
-            "master_handover": 800.00
+            "master_id": test_master.id
         }
         
         # Создаем заявку
@@ -527,16 +539,13 @@ class TestDatabaseIntegration:
         
         request_id = response.json()["id"]
         
-        # Проверяем что заявка создалась
-        response = authenticated_client.get(f"/api/v1/requests/{request_id}")
-        assert response.status_code == 200
-        
-        # Обновляем заявку
+        # Обновляем заявку; PUT возвращает обновленную запись
         response = authenticated_client.put(f"/api/v1/requests/{request_id}", 
             json={"status": "completed"})
         assert response.status_code == 200
+        assert response.json()["status"] == "completed"
         
-        # Проверяем что обновление сохранилось
+        # Проверяем что обновление сохранилось в базе, а не только в ответе PUT
         response = authenticated_client.get(f"/api/v1/requests/{request_id}")
         assert response.status_code == 200
         assert response.json()["status"] == "completed"
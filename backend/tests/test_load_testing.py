@@ -5,16 +5,40 @@ Load Testing тесты для проверки производительнос
 import pytest
 import asyncio
 import aiohttp
+from yarl import URL
 import time
-import statistics
+import numpy as np
 from concurrent.futures import ThreadPoolExecutor
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Iterable, NamedTuple
 import json
+import contextlib
+import tracemalloc
 from datetime import datetime, timedelta
 import random
 import string
 
 
+# Endpoints, которые опрашивает типичная пользовательская сессия
+_ENDPOINTS = (
+    "/api/v1/health",
+    "/api/v1/requests/",
+    "/api/v1/transactions/",
+    "/api/v1/users/",
+    "/api/v1/metrics/business"
+)
+
+_RNG = np.random.default_rng()
+
+# Тела POST/PATCH запросов сценариев сериализуются один раз при импорте
+_JSON_HEADERS = {"Content-Type": "application/json"}
+_CALLCENTER_REQUEST_BODY = json.dumps({
+    "client_name": "Test Client",
+    "client_phone": "+79123456789",
+    "description": "Test request"
+}).encode("utf-8")
+_MASTER_STATUS_BODY = json.dumps({"status": "in_progress"}).encode("utf-8")
+
+
 class LoadTestConfig:
     """Конфигурация для нагрузочных тестов"""
     BASE_URL = "http://localhost:8000"
@@ -29,159 +53,236 @@ class LoadTestConfig:
 class LoadTestMetrics:
     """Метрики для нагрузочного тестирования"""
     
-    def __init__(self):
-        self.response_times: List[float] = []
-        self.error_count = 0
-        self.success_count = 0
+    def __init__(self, capacity: int = 1024):
+        # Struct-of-Arrays: время и статус каждого запроса в предвыделенных массивах
+        self.times = np.empty(capacity, dtype=np.float32)
+        self.status = np.empty(capacity, dtype=np.int16)
+        self.n = 0
+        self.start_time = None
+        self.end_time = None
+    
+    def reset(self):
+        """Сбросить накопленные результаты, сохранив выделенные массивы"""
+        self.n = 0
         self.start_time = None
         self.end_time = None
-        self.status_codes: Dict[int, int] = {}
     
     def add_response(self, response_time: float, status_code: int):
         """Добавить результат запроса"""
-        self.response_times.append(response_time)
-        
-        if status_code >= 400:
-            self.error_count += 1
-        else:
-            self.success_count += 1
-        
-        self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+        i = self.n
+        if i == self.times.size:
+            self.times = np.resize(self.times, i * 2)
+            self.status = np.resize(self.status, i * 2)
+        self.times[i] = response_time
+        self.status[i] = status_code
+        self.n = i + 1
+    
+    def extend(self, results: List["RequestResult"]):
+        """Добавить результаты пачкой, одной записью в массивы"""
+        end = self.n + len(results)
+        if end > self.times.size:
+            size = max(end, self.times.size * 2)
+            self.times = np.resize(self.times, size)
+            self.status = np.resize(self.status, size)
+        self.times[self.n:end] = [result.response_time for result in results]
+        self.status[self.n:end] = [result.status_code for result in results]
+        self.n = end
     
     def get_statistics(self) -> Dict[str, Any]:
         """Получить статистику тестирования"""
-        total_requests = len(self.response_times)
+        total_requests = self.n
         
-        if not self.response_times:
+        if not total_requests:
             return {"error": "No requests completed"}
         
+        # Все квантили за один проход по массиву вместо отдельной сортировки на каждый
+        times = self.times[:total_requests]
+        p0, p50, p95, p99, p100 = np.percentile(times, [0, 50, 95, 99, 100])
+        # Гистограмма статусов, успехи и ошибки считаются за один bincount
+        counts = np.bincount(self.status[:total_requests])
+        error_count = int(counts[400:].sum())
+        
         return {
             "total_requests": total_requests,
-            "successful_requests": self.success_count,
-            "failed_requests": self.error_count,
-            "error_rate": self.error_count / total_requests if total_requests > 0 else 0,
-            "average_response_time": statistics.mean(self.response_times),
-            "median_response_time": statistics.median(self.response_times),
-            "min_response_time": min(self.response_times),
-            "max_response_time": max(self.response_times),
-            "95th_percentile": self._percentile(self.response_times, 95),
-            "99th_percentile": self._percentile(self.response_times, 99),
+            "successful_requests": total_requests - error_count,
+            "failed_requests": error_count,
+            "error_rate": error_count / total_requests,
+            "average_response_time": float(times.mean(dtype=np.float64)),
+            "median_response_time": float(p50),
+            "min_response_time": float(p0),
+            "max_response_time": float(p100),
+            "95th_percentile": float(p95),
+            "99th_percentile": float(p99),
             "requests_per_second": total_requests / (self.end_time - self.start_time) if self.end_time and self.start_time else 0,
-            "status_codes": self.status_codes,
+            "status_codes": {int(code): int(counts[code]) for code in np.flatnonzero(counts)},
             "test_duration": self.end_time - self.start_time if self.end_time and self.start_time else 0
         }
     
     @staticmethod
-    def _percentile(data: List[float], percentile: int) -> float:
-        """Вычислить percentile"""
-        sorted_data = sorted(data)
-        index = int(len(sorted_data) * percentile / 100)
-        return sorted_data[min(index, len(sorted_data) - 1)]
+    def _percentile(data, percentile: int) -> float:
+        """Вычислить percentile (nearest-rank) за O(N) через quickselect"""
+        arr = np.asarray(data)
+        index = min(int(arr.size * percentile / 100), arr.size - 1)
+        return float(np.partition(arr, index)[index])
+
+
+class RequestResult(NamedTuple):
+    """Результат одного запроса нагрузочного теста"""
+    status_code: int
+    response_time: float
+    content: Optional[bytes] = None
+    error: Optional[str] = None
+
+
+def create_load_test_session(config: LoadTestConfig) -> aiohttp.ClientSession:
+    """Создать HTTP сессию с лимитами соединений под нагрузочные тесты"""
+    connector = aiohttp.TCPConnector(
+        limit=0,
+        limit_per_host=max(500, config.CONCURRENT_USERS * 4),
+        ttl_dns_cache=300,
+        keepalive_timeout=75,
+        enable_cleanup_closed=True
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=30)
+    )
 
 
 class LoadTestRunner:
     """Основной класс для выполнения нагрузочных тестов"""
     
-    def __init__(self, config: LoadTestConfig):
+    def __init__(self, config: LoadTestConfig, session: Optional[aiohttp.ClientSession] = None):
         self.config = config
-        self.metrics = LoadTestMetrics()
-        self.session = None
+        self.metrics = LoadTestMetrics(config.CONCURRENT_USERS * config.REQUESTS_PER_USER)
+        # Переданная снаружи сессия переиспользуется и не закрывается раннером
+        self.session = session
+        self._owns_session = session is None
+        # URL разбираются один раз на endpoint, а не на каждый запрос
+        self._urls: Dict[str, URL] = {
+            endpoint: URL(f"{config.BASE_URL}{endpoint}") for endpoint in _ENDPOINTS
+        }
     
     async def setup_session(self):
         """Настройка HTTP сессии"""
-        connector = aiohttp.TCPConnector(
-            limit=self.config.CONCURRENT_USERS * 2,
-            limit_per_host=self.config.CONCURRENT_USERS * 2
-        )
-        self.session = aiohttp.ClientSession(
-            connector=connector,
-            timeout=aiohttp.ClientTimeout(total=30)
-        )
+        if self.session is None:
+            self.session = create_load_test_session(self.config)
     
     async def cleanup_session(self):
         """Очистка HTTP сессии"""
-        if self.session:
+        if self.session and self._owns_session:
             await self.session.close()
+            self.session = None
     
-    async def make_request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
-        """Выполнить HTTP запрос с измерением времени"""
-        start_time = time.time()
+    async def make_request(
+        self, method: str, endpoint: str, read_body: bool = False,
+        record: bool = True, **kwargs
+    ) -> RequestResult:
+        """Выполнить HTTP запрос с измерением времени
+        
+        При record=False результат не пишется в метрики: вызывающий код
+        добавляет его сам, например пачкой через LoadTestMetrics.extend.
+        """
+        # Монотонные часы цикла не зависят от коррекций системного времени
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+        
+        url = self._urls.get(endpoint)
+        if url is None:
+            url = self._urls[endpoint] = URL(f"{self.config.BASE_URL}{endpoint}")
         
         try:
-            async with self.session.request(
-                method, 
-                f"{self.config.BASE_URL}{endpoint}",
-                **kwargs
-            ) as response:
-                response_time = time.time() - start_time
+            async with self.session.request(method, url, **kwargs) as response:
+                response_time = loop.time() - start_time
                 
-                # Читаем содержимое ответа
-                try:
-                    content = await response.text()
-                except:
-                    content = ""
+                # Тело дочитывается без декодирования в str: release() до конца
+                # payload закрыл бы соединение вместо возврата в пул keep-alive
+                content = None
+                with contextlib.suppress(aiohttp.ClientPayloadError):
+                    content = await response.read()
                 
-                self.metrics.add_response(response_time, response.status)
+                if record:
+                    self.metrics.add_response(response_time, response.status)
                 
-                return {
-                    "status_code": response.status,
-                    "response_time": response_time,
-                    "content": content,
-                    "headers": dict(response.headers)
-                }
-        
-        except Exception as e:
-            response_time = time.time() - start_time
-            self.metrics.add_response(response_time, 500)
+                return RequestResult(
+                    response.status, response_time, content if read_body else None
+                )
+        
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            response_time = loop.time() - start_time
+            if record:
+                self.metrics.add_response(response_time, 500)
             
-            return {
-                "status_code": 500,
-                "response_time": response_time,
-                "error": str(e)
-            }
+            # Только имя типа: форматирование сообщения дорого на горячем пути ошибок
+            return RequestResult(500, response_time, error=type(e).__name__)
     
-    async def simulate_user_session(self, user_id: int) -> List[Dict[str, Any]]:
+    async def simulate_user_session(self, user_id: int) -> List[RequestResult]:
         """Симуляция пользовательской сессии"""
         results = []
         
-        # Случайная задержка для имитации ramp-up
-        await asyncio.sleep(random.uniform(0, self.config.RAMP_UP_TIME))
+        # Endpoints и паузы между запросами разыгрываем сразу на всю сессию
+        endpoints = random.choices(_ENDPOINTS, k=self.config.REQUESTS_PER_USER)
+        pauses = _RNG.uniform(0.1, 0.5, size=self.config.REQUESTS_PER_USER).tolist()
         
-        for request_num in range(self.config.REQUESTS_PER_USER):
-            # Случайный выбор endpoint для тестирования
-            endpoint = random.choice([
-                "/api/v1/health",
-                "/api/v1/requests/",
-                "/api/v1/transactions/",
-                "/api/v1/users/",
-                "/api/v1/metrics/business"
-            ])
-            
-            result = await self.make_request("GET", endpoint)
-            results.append(result)
-            
-            # Небольшая задержка между запросами
-            await asyncio.sleep(random.uniform(0.1, 0.5))
+        # Результаты копятся локально и попадают в метрики одной пачкой
+        try:
+            for endpoint, pause in zip(endpoints, pauses):
+                result = await self.make_request("GET", endpoint, record=False)
+                results.append(result)
+                
+                # Небольшая задержка между запросами
+                await asyncio.sleep(pause)
+        finally:
+            self.metrics.extend(results)
         
         return results
     
+    async def run_requests(self, method: str, endpoints: Iterable[str]):
+        """Выполнить поток запросов не более чем CONCURRENT_USERS воркерами одновременно"""
+        pending = iter(endpoints)
+        
+        async def worker():
+            for endpoint in pending:
+                await self.make_request(method, endpoint)
+        
+        workers = [
+            asyncio.create_task(worker())
+            for _ in range(self.config.CONCURRENT_USERS)
+        ]
+        for future in asyncio.as_completed(workers):
+            await future
+    
     async def run_load_test(self) -> Dict[str, Any]:
         """Запустить нагрузочный тест"""
         await self.setup_session()
         
+        loop = asyncio.get_running_loop()
+        
         try:
-            self.metrics.start_time = time.time()
+            self.metrics.start_time = loop.time()
             
-            # Создаем задачи для всех пользователей
-            tasks = [
-                self.simulate_user_session(user_id) 
-                for user_id in range(self.config.CONCURRENT_USERS)
-            ]
+            # Пользователи стартуют равномерно в течение RAMP_UP_TIME, а задача
+            # создается только в момент старта пользователя
+            users = self.config.CONCURRENT_USERS
+            step = self.config.RAMP_UP_TIME / users
+            tasks = []
+            all_started = asyncio.Event()
             
-            # Выполняем все задачи параллельно
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+            def launch_user(user_id: int):
+                tasks.append(asyncio.create_task(self.simulate_user_session(user_id)))
+                if len(tasks) == users:
+                    all_started.set()
             
-            self.metrics.end_time = time.time()
+            for user_id in range(users):
+                loop.call_later(user_id * step, launch_user, user_id)
+            await all_started.wait()
+            
+            # Результаты уже учтены в метриках, поэтому не собираем их в список
+            for future in asyncio.as_completed(tasks):
+                with contextlib.suppress(Exception):
+                    await future
+            
+            self.metrics.end_time = loop.time()
             
             return self.metrics.get_statistics()
         
@@ -189,98 +290,79 @@ class LoadTestRunner:
             await self.cleanup_session()
 
 
+@pytest.fixture(scope="module")
+async def shared_session():
+    """Одна HTTP сессия на все нагрузочные тесты модуля"""
+    session = create_load_test_session(LoadTestConfig())
+    yield session
+    await session.close()
+
+
 class TestLoadTesting:
     """Тесты нагрузочного тестирования"""
     
     @pytest.mark.asyncio
-    async def test_basic_load_test(self):
-        """Базовый нагрузочный тест"""
+    @pytest.mark.parametrize(
+        "users,requests_per_user,ramp_up,max_error_rate,max_response_time",
+        [
+            # Базовый нагрузочный тест
+            pytest.param(10, 5, 10, LoadTestConfig.ACCEPTABLE_ERROR_RATE,
+                         LoadTestConfig.ACCEPTABLE_RESPONSE_TIME, id="basic"),
+            # Стресс-тест: допускается более высокий error rate
+            pytest.param(100, 10, 10, 0.2, None, id="stress"),
+            # Пиковая нагрузка с быстрым ramp-up: система не должна падать
+            pytest.param(200, 3, 1, None, None, id="spike"),
+            # Тест на выносливость (длительная нагрузка)
+            pytest.param(20, 50, 10, 0.1, None, id="endurance"),
+        ]
+    )
+    async def test_load_profile(
+        self,
+        shared_session: aiohttp.ClientSession,
+        users: int,
+        requests_per_user: int,
+        ramp_up: int,
+        max_error_rate: Optional[float],
+        max_response_time: Optional[float]
+    ):
+        """Нагрузочный тест с заданным профилем нагрузки"""
         config = LoadTestConfig()
-        config.CONCURRENT_USERS = 10
-        config.REQUESTS_PER_USER = 5
+        config.CONCURRENT_USERS = users
+        config.REQUESTS_PER_USER = requests_per_user
+        config.RAMP_UP_TIME = ramp_up
         
-        runner = LoadTestRunner(config)
+        runner = LoadTestRunner(config, session=shared_session)
         stats = await runner.run_load_test()
         
         # Проверяем основные метрики
         assert stats["total_requests"] > 0
-        assert stats["error_rate"] < config.ACCEPTABLE_ERROR_RATE
-        assert stats["average_response_time"] < config.ACCEPTABLE_RESPONSE_TIME
+        if max_error_rate is not None:
+            assert stats["error_rate"] < max_error_rate
+        if max_response_time is not None:
+            assert stats["average_response_time"] < max_response_time
         
         print(f"Load Test Results: {json.dumps(stats, indent=2)}")
-    
-    @pytest.mark.asyncio
-    async def test_stress_test(self):
-        """Стресс-тест с высокой нагрузкой"""
-        config = LoadTestConfig()
-        config.CONCURRENT_USERS = 100
-        config.REQUESTS_PER_USER = 10
-        
-        runner = LoadTestRunner(config)
-        stats = await runner.run_load_test()
-        
-        # В стресс-тесте допускается более высокий error rate
-        assert stats["total_requests"] > 0
-        assert stats["error_rate"] < 0.2  # 20%
-        
-        print(f"Stress Test Results: {json.dumps(stats, indent=2)}")
-    
-    @pytest.mark.asyncio
-    async def test_spike_test(self):
-        """Тест пиковой нагрузки"""
-        config = LoadTestConfig()
-        config.CONCURRENT_USERS = 200
-        config.REQUESTS_PER_USER = 3
-        config.RAMP_UP_TIME = 1  # Быстрый ramp-up
-        
-        runner = LoadTestRunner(config)
-        stats = await runner.run_load_test()
-        
-        # Проверяем, что система выдерживает пиковую нагрузку
-        assert stats["total_requests"] > 0
-        print(f"Spike Test Results: {json.dumps(stats, indent=2)}")
-    
-    @pytest.mark.asyncio
-    async def test_endurance_test(self):
-        """Тест на выносливость (длительная нагрузка)"""
-        config = LoadTestConfig()
-        config.CONCURRENT_USERS = 20
-        config.REQUESTS_PER_USER = 50
-        config.TEST_DURATION = 120  # 2 минуты
-        
-        runner = LoadTestRunner(config)
-        stats = await runner.run_load_test()
-        
-        # Проверяем стабильность при длительной нагрузке
-        assert stats["total_requests"] > 0
-        assert stats["error_rate"] < 0.1  # 10%
-        
-        print(f"Endurance Test Results: {json.dumps(stats, indent=2)}")
 
 
 class TestSpecificEndpointLoad:
     """Тесты нагрузки на конкретные endpoints"""
     
     @pytest.mark.asyncio
-    async def test_requests_endpoint_load(self):
+    async def test_requests_endpoint_load(self, shared_session: aiohttp.ClientSession):
         """Нагрузочный тест для endpoint заявок"""
         config = LoadTestConfig()
         config.CONCURRENT_USERS = 30
         config.REQUESTS_PER_USER = 10
         
-        runner = LoadTestRunner(config)
+        runner = LoadTestRunner(config, session=shared_session)
         await runner.setup_session()
         
         try:
             runner.metrics.start_time = time.time()
             
             # Тестируем только endpoint заявок
-            tasks = []
-            for _ in range(config.CONCURRENT_USERS):
-                for _ in range(config.REQUESTS_PER_USER):
-                    tasks.append(runner.make_request("GET", "/api/v1/requests/"))
-            
-            await asyncio.gather(*tasks)
+            total = config.CONCURRENT_USERS * config.REQUESTS_PER_USER
+            await runner.run_requests("GET", ["/api/v1/requests/"] * total)
             runner.metrics.end_time = time.time()
             
             stats = runner.metrics.get_statistics()
@@ -295,13 +377,13 @@ class TestSpecificEndpointLoad:
             await runner.cleanup_session()
     
     @pytest.mark.asyncio
-    async def test_database_intensive_load(self):
+    async def test_database_intensive_load(self, shared_session: aiohttp.ClientSession):
         """Тест нагрузки на БД-интенсивные операции"""
         config = LoadTestConfig()
         config.CONCURRENT_USERS = 25
         config.REQUESTS_PER_USER = 8
         
-        runner = LoadTestRunner(config)
+        runner = LoadTestRunner(config, session=shared_session)
         await runner.setup_session()
         
         try:
@@ -315,13 +397,8 @@ class TestSpecificEndpointLoad:
                 "/api/v1/metrics/business"
             ]
             
-            tasks = []
-            for _ in range(config.CONCURRENT_USERS):
-                for _ in range(config.REQUESTS_PER_USER):
-                    endpoint = random.choice(db_endpoints)
-                    tasks.append(runner.make_request("GET", endpoint))
-            
-            await asyncio.gather(*tasks)
+            total = config.CONCURRENT_USERS * config.REQUESTS_PER_USER
+            await runner.run_requests("GET", random.choices(db_endpoints, k=total))
             runner.metrics.end_time = time.time()
             
             stats = runner.metrics.get_statistics()
@@ -340,43 +417,47 @@ class TestMemoryAndResourceLoad:
     """Тесты нагрузки на память и ресурсы"""
     
     @pytest.mark.asyncio
-    async def test_memory_leak_detection(self):
+    async def test_memory_leak_detection(self, shared_session: aiohttp.ClientSession):
         """Тест на обнаружение утечек памяти"""
-        import psutil
-        import os
-        
-        process = psutil.Process(os.getpid())
-        initial_memory = process.memory_info().rss
-        
         config = LoadTestConfig()
         config.CONCURRENT_USERS = 50
         config.REQUESTS_PER_USER = 20
         
-        # Выполняем несколько циклов тестирования
-        for cycle in range(3):
-            runner = LoadTestRunner(config)
-            await runner.run_load_test()
-            
-            # Принудительная сборка мусора
-            import gc
-            gc.collect()
-            
-            current_memory = process.memory_info().rss
-            memory_increase = current_memory - initial_memory
-            
-            print(f"Cycle {cycle + 1}: Memory increase: {memory_increase / 1024 / 1024:.2f} MB")
+        # Сравнение снимков tracemalloc показывает прирост по строкам кода
+        # и не требует полной сборки мусора после каждого цикла
+        # Один раннер и одна сессия на все циклы, чтобы в прирост памяти
+        # не попадало создание соединений и коннектора
+        runner = LoadTestRunner(config, session=shared_session)
+        
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.take_snapshot()
             
-            # Проверяем, что увеличение памяти не критично
-            assert memory_increase < 100 * 1024 * 1024  # Менее 100MB
+            # Выполняем несколько циклов тестирования
+            for cycle in range(3):
+                runner.metrics.reset()
+                await runner.run_load_test()
+                
+                stats = tracemalloc.take_snapshot().compare_to(baseline, "lineno")
+                memory_increase = sum(stat.size_diff for stat in stats)
+                
+                print(f"Cycle {cycle + 1}: Memory increase: {memory_increase / 1024 / 1024:.2f} MB")
+                for stat in stats[:3]:
+                    print(f"  {stat}")
+                
+                # Проверяем, что увеличение памяти не критично
+                assert memory_increase < 100 * 1024 * 1024  # Менее 100MB
+        finally:
+            tracemalloc.stop()
     
     @pytest.mark.asyncio
-    async def test_concurrent_connections_limit(self):
+    async def test_concurrent_connections_limit(self, shared_session: aiohttp.ClientSession):
         """Тест лимита одновременных соединений"""
         config = LoadTestConfig()
         config.CONCURRENT_USERS = 500  # Очень высокая нагрузка
         config.REQUESTS_PER_USER = 1
         
-        runner = LoadTestRunner(config)
+        runner = LoadTestRunner(config, session=shared_session)
         stats = await runner.run_load_test()
         
         # Проверяем, что система не падает при большом количестве соединений
@@ -390,12 +471,12 @@ class TestRealisticUserScenarios:
     """Тесты реалистичных пользовательских сценариев"""
     
     @pytest.mark.asyncio
-    async def test_realistic_user_behavior(self):
+    async def test_realistic_user_behavior(self, shared_session: aiohttp.ClientSession):
         """Тест реалистичного поведения пользователей"""
         config = LoadTestConfig()
         config.CONCURRENT_USERS = 20
         
-        runner = LoadTestRunner(config)
+        runner = LoadTestRunner(config, session=shared_session)
         await runner.setup_session()
         
         try:
@@ -434,11 +515,10 @@ class TestRealisticUserScenarios:
         await runner.make_request("GET", "/api/v1/requests/")
         await asyncio.sleep(2)
         
-        await runner.make_request("POST", "/api/v1/requests/", json={
-            "client_name": "Test Client",
-            "client_phone": "+79123456789",
-            "description": "Test request"
-        })
+        await runner.make_request(
+            "POST", "/api/v1/requests/",
+            data=_CALLCENTER_REQUEST_BODY, headers=_JSON_HEADERS
+        )
         await asyncio.sleep(1)
         
         await runner.make_request("GET", "/api/v1/requests/statistics")
@@ -462,9 +542,10 @@ class TestRealisticUserScenarios:
         await runner.make_request("GET", "/api/v1/requests/?assigned_to_me=true")
         await asyncio.sleep(1)
         
-        await runner.make_request("PATCH", "/api/v1/requests/1", json={
-            "status": "in_progress"
-        })
+        await runner.make_request(
+            "PATCH", "/api/v1/requests/1",
+            data=_MASTER_STATUS_BODY, headers=_JSON_HEADERS
+        )
         await asyncio.sleep(2)
         
         await runner.make_request("GET", "/api/v1/requests/1")
@@ -484,29 +565,69 @@ class TestRealisticUserScenarios:
 
 
 # Утилиты для генерации тестовых данных
+_ALPHABET = np.frombuffer(string.ascii_letters.encode(), dtype="S1")
+_PRIORITIES = ("low", "medium", "high")
+_TRANSACTION_STATUSES = ("pending", "completed", "failed")
+
+
+def _random_strings(n: int, length: int) -> List[str]:
+    """Сгенерировать n случайных строк из латинских букв одним вызовом NumPy"""
+    letters = _RNG.choice(_ALPHABET, size=(n, length))
+    return [row.decode() for row in letters.view(f"S{length}").ravel()]
+
+
+def generate_request_batch(n: int) -> List[Dict[str, Any]]:
+    """Генерация n наборов случайных данных для заявок"""
+    names = _random_strings(n, 10)
+    descriptions = _random_strings(n, 50)
+    phones = _RNG.integers(1000, 10000, size=n).tolist()
+    emails = _RNG.integers(1, 1001, size=n).tolist()
+    addresses = _RNG.integers(1, 101, size=n).tolist()
+    city_ids = _RNG.integers(1, 6, size=n).tolist()
+    type_ids = _RNG.integers(1, 4, size=n).tolist()
+    priorities = _RNG.integers(0, len(_PRIORITIES), size=n).tolist()
+    return [
+        {
+            "client_name": f"Client {names[i]}",
+            "client_phone": f"+7912345{phones[i]}",
+            "client_email": f"client{emails[i]}@example.com",
+            "address": f"Address {addresses[i]}",
+            "description": f"Description {descriptions[i]}",
+            "city_id": city_ids[i],
+            "request_type_id": type_ids[i],
+            "priority": _PRIORITIES[priorities[i]]
+        }
+        for i in range(n)
+    ]
+
+
+def generate_transaction_batch(n: int) -> List[Dict[str, Any]]:
+    """Генерация n наборов случайных данных для транзакций"""
+    amounts = _RNG.uniform(100, 10000, size=n).round(2).tolist()
+    type_ids = _RNG.integers(1, 4, size=n).tolist()
+    descriptions = _random_strings(n, 30)
+    city_ids = _RNG.integers(1, 6, size=n).tolist()
+    statuses = _RNG.integers(0, len(_TRANSACTION_STATUSES), size=n).tolist()
+    return [
+        {
+            "amount": amounts[i],
+            "transaction_type_id": type_ids[i],
+            "description": f"Transaction {descriptions[i]}",
+            "city_id": city_ids[i],
+            "status": _TRANSACTION_STATUSES[statuses[i]]
+        }
+        for i in range(n)
+    ]
+
+
 def generate_random_request_data() -> Dict[str, Any]:
     """Генерация случайных данных для заявки"""
-    return {
-        "client_name": f"Client {''.join(random.choices(string.ascii_letters, k=10))}",
-        "client_phone": f"+7912345{random.randint(1000, 9999)}",
-        "client_email": f"client{random.randint(1, 1000)}@example.com",
-        "address": f"Address {random.randint(1, 100)}",
-        "description": f"Description {''.join(random.choices(string.ascii_letters, k=50))}",
-        "city_id": random.randint(1, 5),
-        "request_type_id": random.randint(1, 3),
-        "priority": random.choice(["low", "medium", "high"])
-    }
+    return generate_request_batch(1)[0]
 
 
 def generate_random_transaction_data() -> Dict[str, Any]:
     """Генерация случайных данных для транзакции"""
-    return {
-        "amount": round(random.uniform(100, 10000), 2),
-        "transaction_type_id": random.randint(1, 3),
-        "description": f"Transaction {''.join(random.choices(string.ascii_letters, k=30))}",
-        "city_id": random.randint(1, 5),
-        "status": random.choice(["pending", "completed", "failed"])
-    }
+    return generate_transaction_batch(1)[0]
 
 
 if __name__ == "__main__":
@@ -530,4 +651,11 @@ if __name__ == "__main__":
         else:
             print(f"✅ RESPONSE TIME OK: {stats['average_response_time']:.2f}s")
     
+    # uvloop заметно быстрее стандартного цикла при большом числе соединений
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+    
     asyncio.run(main()) 
\ No newline at end of file
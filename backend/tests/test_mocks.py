@@ -46,7 +46,7 @@ class TestExternalAPIMocks:
         assert recording_service.is_running is False
     
     @patch('app.api.mango.requests')
-    def test_mango_office_api_mock(self, mock_requests):
+    def test_mango_office_api_mock(self, mock_requests, session_client: TestClient):
         """Тест мокирования Mango Office API"""
         # Настраиваем мок ответа
         mock_response = Mock()
@@ -59,12 +59,10 @@ class TestExternalAPIMocks:
         }
         mock_requests.get.return_value = mock_response
         
-        # Тестируем с клиентом
-        with TestClient(app) as client:
-            # Этот endpoint может использовать Mango Office API
-            response = client.get("/api/v1/mango/calls")
-            # Проверяем что запрос не падает (может быть 401 из-за авторизации)
-            assert response.status_code in [200, 401, 404]
+        # Этот endpoint может использовать Mango Office API
+        response = session_client.get("/api/v1/mango/calls")
+        # Проверяем что запрос не падает (может быть 401 из-за авторизации)
+        assert response.status_code in [200, 401, 404]
     
     @patch('smtplib.SMTP')
     def test_smtp_mock(self, mock_smtp):
@@ -148,7 +146,9 @@ class TestIntegrationWithMocks:
     
     @patch('app.services.email_client.EmailClient')
     @patch('app.services.recording_service.recording_service')
-    def test_full_app_with_mocks(self, mock_recording_service, mock_email_client):
+    def test_full_app_with_mocks(
+        self, mock_recording_service, mock_email_client, session_client: TestClient
+    ):
         """Тест полного приложения с заглушками внешних сервисов"""
         # Настраиваем все моки
         mock_email_instance = Mock()
@@ -161,21 +161,20 @@ class TestIntegrationWithMocks:
         mock_recording_service.is_running = False
         
         # Тестируем основные endpoints
-        with TestClient(app) as client:
-            # Health check должен работать
-            response = client.get("/api/v1/health")
-            assert response.status_code in [200, 500]  # 500 из-за БД, но endpoint работает
-            
-            # Документация должна работать
-            response = client.get("/docs")
-            assert response.status_code == 200
-            
-            # API schema должна работать
-            response = client.get("/openapi.json")
-            assert response.status_code == 200
+        # Health check должен работать
+        response = session_client.get("/api/v1/health")
+        assert response.status_code in [200, 500]  # 500 из-за БД, но endpoint работает
+        
+        # Документация должна работать
+        response = session_client.get("/docs")
+        assert response.status_code == 200
+        
+        # API schema должна работать
+        response = session_client.get("/openapi.json")
+        assert response.status_code == 200
     
     @patch('app.monitoring.metrics.performance_collector')
-    def test_metrics_with_mock(self, mock_metrics):
+    def test_metrics_with_mock(self, mock_metrics, session_client: TestClient):
         """Тест метрик с мокированием"""
         # Настраиваем мок
         mock_metrics.collect_request_metrics.return_value = None
@@ -186,10 +185,9 @@ class TestIntegrationWithMocks:
         }
         
         # Тестируем
-        with TestClient(app) as client:
-            response = client.get("/api/v1/metrics")
-            # Может быть 401 из-за авторизации, но endpoint существует
-            assert response.status_code in [200, 401]
+        response = session_client.get("/api/v1/metrics")
+        # Может быть 401 из-за авторизации, но endpoint существует
+        assert response.status_code in [200, 401]
     
     @patch('asyncio.create_task')
     def test_background_tasks_mock(self, mock_create_task):
@@ -209,16 +207,15 @@ class TestErrorHandlingWithMocks:
     """Тесты обработки ошибок с моками"""
     
     @patch('app.core.database.engine')
-    def test_database_error_handling(self, mock_engine):
+    def test_database_error_handling(self, mock_engine, session_client: TestClient):
         """Тест обработки ошибок БД"""
         # Настраиваем мок для выброса ошибки
         mock_engine.begin.side_effect = Exception("Database connection failed")
         
         # Тестируем что приложение обрабатывает ошибку
-        with TestClient(app) as client:
-            response = client.get("/api/v1/health")
-            # Должна быть обработана ошибка
-            assert response.status_code in [500, 503]
+        response = session_client.get("/api/v1/health")
+        # Должна быть обработана ошибка
+        assert response.status_code in [500, 503]
     
     @patch('app.services.email_client.EmailClient')
     def test_email_service_error_handling(self, mock_email_client):
@@ -226,7 +223,8 @@ class TestErrorHandlingWithMocks:
         # Настраиваем мок для выброса ошибки
         mock_email_client.side_effect = Exception("Email service unavailable")
         
-        # Тестируем что приложение не падает
+        # Тестируем что приложение не падает; здесь нужен собственный запуск
+        # приложения, поэтому общий клиент сессии не используется
         with TestClient(app) as client:
             # Приложение должно запуститься даже если email сервис недоступен
             response = client.get("/docs")
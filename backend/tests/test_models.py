@@ -1,6 +1,8 @@
 import pytest
 from datetime import datetime, date
 from decimal import Decimal
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.models import (
@@ -10,6 +12,12 @@ from app.core.models import (
 )
 
 
+@pytest.fixture
+def db_session(nested_session: AsyncSession) -> AsyncSession:
+    """Сессия в SAVEPOINT поверх схемы и справочников, созданных один раз на модуль"""
+    return nested_session
+
+
 @pytest.mark.asyncio
 class TestCityModel:
     """Тесты модели City"""
@@ -18,25 +26,18 @@ class TestCityModel:
         """Тест создания города"""
         city = City(name="Москва")
         db_session.add(city)
-        await db_session.commit()
-        await db_session.refresh(city)
+        await db_session.flush()
         
         assert city.id is not None
         assert city.name == "Москва"
     
     async def test_city_unique_name(self, db_session: AsyncSession):
         """Тест уникальности имени города"""
-        city1 = City(name="Санкт-Петербург")
-        city2 = City(name="Санкт-Петербург")
-        
-        db_session.add(city1)
-        await db_session.commit()
-        
-        db_session.add(city2)
-        
-        # Должно вызвать ошибку уникальности
-        with pytest.raises(Exception):
-            await db_session.commit()
+        # Город с таким именем уже есть среди справочников модуля;
+        # ошибка откатывает только вложенный SAVEPOINT
+        with pytest.raises(IntegrityError):
+            async with db_session.begin_nested():
+                await db_session.execute(insert(City).values(name="Тестовый город"))
 
 
 @pytest.mark.asyncio
@@ -47,41 +48,30 @@ class TestRoleModel:
         """Тест создания роли"""
         role = Role(name="manager")
         db_session.add(role)
-        await db_session.commit()
-        await db_session.refresh(role)
+        await db_session.flush()
         
         assert role.id is not None
         assert role.name == "manager"
     
     async def test_role_unique_name(self, db_session: AsyncSession):
         """Тест уникальности имени роли"""
-        role1 = Role(name="admin")
-        role2 = Role(name="admin")
-        
-        db_session.add(role1)
-        await db_session.commit()
-        
-        db_session.add(role2)
-        
-        with pytest.raises(Exception):
-            await db_session.commit()
+        # Роль admin уже есть среди справочников модуля
+        with pytest.raises(IntegrityError):
+            async with db_session.begin_nested():
+                await db_session.execute(insert(Role).values(name="admin"))
 
 
 @pytest.mark.asyncio
 class TestMasterModel:
     """Тесты модели Master"""
     
-    async def test_create_master(self, db_session: AsyncSession):
+    async def test_create_master(self, db_session: AsyncSession, seeded_ids: dict):
         """Тест создания мастера"""
-        # Создаем город
-        city = City(name="Тестовый город")
-        db_session.add(city)
-        await db_session.commit()
-        await db_session.refresh(city)
+        city_id = seeded_ids["cities"]["Тестовый город"]
         
         # Создаем мастера
         master = Master(
-            city_id=city.id,
+            city_id=city_id,
             full_name="Иван Иванов",
             phone_number="+79991234567",
             birth_date=date(1990, 1, 1),
@@ -91,83 +81,60 @@ class TestMasterModel:
             notes="Тестовые заметки"
         )
         db_session.add(master)
-        await db_session.commit()
-        await db_session.refresh(master)
+        await db_session.flush()
         
         assert master.id is not None
         assert master.full_name == "Иван Иванов"
         assert master.phone_number == "+79991234567"
         assert master.status == "active"  # Значение по умолчанию
-        assert master.city_id == city.id
+        assert master.city_id == city_id
         assert master.created_at is not None
     
-    async def test_master_unique_login(self, db_session: AsyncSession):
+    async def test_master_unique_login(self, db_session: AsyncSession, seeded_ids: dict):
         """Тест уникальности логина мастера"""
-        city = City(name="Тестовый город")
-        db_session.add(city)
-        await db_session.commit()
-        await db_session.refresh(city)
-        
-        master1 = Master(
-            city_id=city.id,
-            full_name="Мастер 1",
-            phone_number="+79991234567",
-            login="unique_login",
-            password_hash="hash1"
-        )
-        
-        master2 = Master(
-            city_id=city.id,
-            full_name="Мастер 2",
-            phone_number="+79991234568",
-            login="unique_login",
-            password_hash="hash2"
-        )
-        
-        db_session.add(master1)
-        await db_session.commit()
-        
-        db_session.add(master2)
-        
-        with pytest.raises(Exception):
-            await db_session.commit()
+        city_id = seeded_ids["cities"]["Тестовый город"]
+        
+        # Проверяется только ограничение БД, поэтому строки вставляются
+        # через Core insert без ORM-объектов и identity map
+        master = {
+            "city_id": city_id,
+            "full_name": "Мастер",
+            "phone_number": "+79991234567",
+            "login": "unique_login",
+            "password_hash": "hash",
+        }
+        await db_session.execute(insert(Master), master)
+        
+        with pytest.raises(IntegrityError):
+            async with db_session.begin_nested():
+                await db_session.execute(insert(Master), master)
 
 
 @pytest.mark.asyncio
 class TestEmployeeModel:
     """Тесты модели Employee"""
     
-    async def test_create_employee(self, db_session: AsyncSession):
+    async def test_create_employee(self, db_session: AsyncSession, seeded_ids: dict):
         """Тест создания сотрудника"""
-        # Создаем роль
-        role = Role(name="callcenter")
-        db_session.add(role)
-        await db_session.commit()
-        await db_session.refresh(role)
-        
-        # Создаем город
-        city = City(name="Тестовый город")
-        db_session.add(city)
-        await db_session.commit()
-        await db_session.refresh(city)
+        role_id = seeded_ids["roles"]["callcenter"]
+        city_id = seeded_ids["cities"]["Тестовый город"]
         
         # Создаем сотрудника
         employee = Employee(
             name="Анна Петрова",
-            role_id=role.id,
-            city_id=city.id,
+            role_id=role_id,
+            city_id=city_id,
             login="anna_employee",
             password_hash="hashed_password",
             notes="Тестовые заметки"
         )
         db_session.add(employee)
-        await db_session.commit()
-        await db_session.refresh(employee)
+        await db_session.flush()
         
         assert employee.id is not None
         assert employee.name == "Анна Петрова"
-        assert employee.role_id == role.id
-        assert employee.city_id == city.id
+        assert employee.role_id == role_id
+        assert employee.city_id == city_id
         assert employee.status == "active"
         assert employee.created_at is not None
 
@@ -176,23 +143,15 @@ class TestEmployeeModel:
 class TestRequestModel:
     """Тесты модели Request"""
     
-    async def test_create_request(self, db_session: AsyncSession):
+    async def test_create_request(self, db_session: AsyncSession, seeded_ids: dict):
         """Тест создания заявки"""
-        # Создаем необходимые зависимости
-        city = City(name="Тестовый город")
-        db_session.add(city)
-        await db_session.commit()
-        await db_session.refresh(city)
-        
-        request_type = RequestType(name="Ремонт")
-        db_session.add(request_type)
-        await db_session.commit()
-        await db_session.refresh(request_type)
+        city_id = seeded_ids["cities"]["Тестовый город"]
+        request_type_id = seeded_ids["request_types"]["Тестовый тип"]
         
         # Создаем заявку
         request = Request(
-            city_id=city.id,
-            request_type_id=request_type.id,
+            city_id=city_id,
+            request_type_id=request_type_id,
             client_phone="+79991234567",
             client_name="Тестовый клиент",
             address="Тестовый адрес",
@@ -203,8 +162,7 @@ class TestRequestModel:
             master_handover=Decimal("800.00")
         )
         db_session.add(request)
-        await db_session.commit()
-        await db_session.refresh(request)
+        await db_session.flush()
         
         assert request.id is not None
         assert request.client_phone == "+79991234567"
@@ -219,31 +177,22 @@ class TestRequestModel:
 class TestTransactionModel:
     """Тесты модели Transaction"""
     
-    async def test_create_transaction(self, db_session: AsyncSession):
+    async def test_create_transaction(self, db_session: AsyncSession, seeded_ids: dict):
         """Тест создания транзакции"""
-        # Создаем необходимые зависимости
-        city = City(name="Тестовый город")
-        db_session.add(city)
-        await db_session.commit()
-        await db_session.refresh(city)
-        
-        transaction_type = TransactionType(name="Доход")
-        db_session.add(transaction_type)
-        await db_session.commit()
-        await db_session.refresh(transaction_type)
+        city_id = seeded_ids["cities"]["Тестовый город"]
+        transaction_type_id = seeded_ids["transaction_types"]["Тестовый тип транзакции"]
         
         # Создаем транзакцию
         transaction = Transaction(
-            city_id=city.id,
-            transaction_type_id=transaction_type.id,
+            city_id=city_id,
+            transaction_type_id=transaction_type_id,
             amount=Decimal("5000.00"),
             notes="Тестовая транзакция",
             specified_date=date.today(),
             payment_reason="Оплата за услуги"
         )
         db_session.add(transaction)
-        await db_session.commit()
-        await db_session.refresh(transaction)
+        await db_session.flush()
         
         assert transaction.id is not None
         assert transaction.amount == Decimal("5000.00")
@@ -256,37 +205,25 @@ class TestTransactionModel:
 class TestFileModel:
     """Тесты модели File"""
     
-    async def test_create_file_for_request(self, db_session: AsyncSession):
+    async def test_create_file_for_request(self, db_session: AsyncSession, seeded_ids: dict):
         """Тест создания файла для заявки"""
-        # Создаем заявку
-        city = City(name="Тестовый город")
-        db_session.add(city)
-        await db_session.commit()
-        await db_session.refresh(city)
-        
-        request_type = RequestType(name="Ремонт")
-        db_session.add(request_type)
-        await db_session.commit()
-        await db_session.refresh(request_type)
+        city_id = seeded_ids["cities"]["Тестовый город"]
+        request_type_id = seeded_ids["request_types"]["Тестовый тип"]
         
         request = Request(
-            city_id=city.id,
-            request_type_id=request_type.id,
+            city_id=city_id,
+            request_type_id=request_type_id,
             client_phone="+79991234567"
         )
-        db_session.add(request)
-        await db_session.commit()
-        await db_session.refresh(request)
         
-        # Создаем файл для заявки
+        # Создаем файл для заявки; request_id проставится при flush
         file = File(
-            request_id=request.id,
+            request=request,
             file_type="bso",
             file_path="/media/test/file.jpg"
         )
-        db_session.add(file)
-        await db_session.commit()
-        await db_session.refresh(file)
+        db_session.add_all([request, file])
+        await db_session.flush()
         
         assert file.id is not None
         assert file.request_id == request.id
@@ -303,10 +240,11 @@ class TestFileModel:
             file_type="bso",
             file_path="/media/test/file.jpg"
         )
-        db_session.add(file)
         
-        with pytest.raises(Exception):
-            await db_session.commit()
+        with pytest.raises(IntegrityError):
+            async with db_session.begin_nested():
+                db_session.add(file)
+                await db_session.flush()
 
 
 # Вспомогательные модели для тестов
@@ -318,8 +256,7 @@ class TestHelperModels:
         """Тест создания типа заявки"""
         request_type = RequestType(name="Установка")
         db_session.add(request_type)
-        await db_session.commit()
-        await db_session.refresh(request_type)
+        await db_session.flush()
         
         assert request_type.id is not None
         assert request_type.name == "Установка"
@@ -328,21 +265,17 @@ class TestHelperModels:
         """Тест создания направления"""
         direction = Direction(name="Кондиционеры")
         db_session.add(direction)
-        await db_session.commit()
-        await db_session.refresh(direction)
+        await db_session.flush()
         
         assert direction.id is not None
         assert direction.name == "Кондиционеры"
     
-    async def test_create_advertising_campaign(self, db_session: AsyncSession):
+    async def test_create_advertising_campaign(self, db_session: AsyncSession, seeded_ids: dict):
         """Тест создания рекламной кампании"""
-        city = City(name="Тестовый город")
-        db_session.add(city)
-        await db_session.commit()
-        await db_session.refresh(city)
+        city_id = seeded_ids["cities"]["Тестовый город"]
         
         campaign = AdvertisingCampaign(
-            city_id=city.id,
+            city_id=city_id,
             name="Тестовая кампания",
             description="Описание кампании",
             budget=Decimal("10000.00"),
@@ -350,8 +283,7 @@ class TestHelperModels:
             end_date=date.today()
         )
         db_session.add(campaign)
-        await db_session.commit()
-        await db_session.refresh(campaign)
+        await db_session.flush()
         
         assert campaign.id is not None
         assert campaign.name == "Тестовая кампания"
@@ -361,8 +293,7 @@ class TestHelperModels:
         """Тест создания типа транзакции"""
         transaction_type = TransactionType(name="Расход")
         db_session.add(transaction_type)
-        await db_session.commit()
-        await db_session.refresh(transaction_type)
+        await db_session.flush()
         
         assert transaction_type.id is not None
         assert transaction_type.name == "Расход" 
\ No newline at end of file
@@ -4,18 +4,37 @@
 import pytest
 import time
 import asyncio
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import gc
+import statistics
+import httpx
 from fastapi.testclient import TestClient
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, text
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection, async_sessionmaker
+from sqlalchemy import select, func, text, insert, event, bindparam
+from sqlalchemy.pool import StaticPool
 from decimal import Decimal
 from datetime import datetime, date
 import psutil
 import os
 from unittest.mock import patch, AsyncMock
 import threading
+import tracemalloc
 from contextlib import contextmanager
 
+try:
+    import resource
+    HAS_RESOURCE = True
+except ImportError:
+    HAS_RESOURCE = False
+
+try:
+    import ijson
+    HAS_IJSON = True
+except ImportError:
+    HAS_IJSON = False
+
+# Текущий процесс тестов; создается один раз, а не при каждом замере
+_PROCESS = psutil.Process(os.getpid())
+
 from app.core.models import (
     City, Role, Master, Employee, Request, Transaction, 
     RequestType, TransactionType
@@ -25,99 +44,196 @@ from app.core.crud import (
     create_transaction, get_transactions
 )
 from app.monitoring.performance import performance_monitor
-from app.core.cache import cache_manager
+from app.core.cache import CacheManager, cache_manager
+from app.core.database import get_db
+from app.main import app
 
 
 @contextmanager
 def measure_time():
-    """Context manager для измерения времени выполнения"""
-    start = time.time()
-    yield lambda: time.time() - start
-    
+    """Context manager для измерения времени выполнения (в секундах)"""
+    # Монотонные часы с наносекундами: не прыгают при коррекции NTP,
+    # а в секунды переводим только итоговую разницу
+    start = time.perf_counter_ns()
+    yield lambda: (time.perf_counter_ns() - start) / 1e9
+
 
 @contextmanager
 def measure_memory():
-    """Context manager для измерения использования памяти"""
-    process = psutil.Process(os.getpid())
-    start_memory = process.memory_info().rss / 1024 / 1024  # MB
-    yield lambda: process.memory_info().rss / 1024 / 1024 - start_memory
+    """Context manager для измерения памяти Python: (текущий прирост, пик) в MB"""
+    # tracemalloc считает аллокации объектов Python и не зависит от того,
+    # вернул ли аллокатор арены ОС, поэтому не дает ложных срабатываний RSS
+    usage = [0.0, 0.0]
+    tracemalloc.start()
+    try:
+        yield lambda: tuple(usage)
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        usage[:] = [current / 1024 / 1024, peak / 1024 / 1024]
 
 
-@pytest.mark.asyncio
+# Список заявок: основной SELECT и по одному selectinload на каждую из 6 связей,
+# плюс текущий пользователь с ролью и городом (3 запроса)
+MAX_REQUESTS_LIST_QUERIES = 10
+
+
+@contextmanager
+def count_queries(bind):
+    """Context manager для подсчета SQL-запросов к движку (engine или connection)"""
+    counter = [0]
+    
+    def _count(*args, **kwargs):
+        counter[0] += 1
+    
+    event.listen(bind.sync_engine, "before_cursor_execute", _count)
+    try:
+        yield counter
+    finally:
+        event.remove(bind.sync_engine, "before_cursor_execute", _count)
+
+
+# Запросы бенчмарков собираются один раз; город передается параметром, поэтому
+# в замер попадает только выполнение, а скомпилированный SQL берется из кеша
+_STMT_ALL_CITIES = select(City)
+_STMT_REQUESTS_BY_CITY = (
+    select(Request).where(Request.city_id == bindparam("city_id")).limit(10)
+)
+_STMT_REQUESTS_WITH_MASTER = (
+    select(Request, City, Master)
+    .join(City, Request.city_id == City.id)
+    .join(Master, Request.master_id == Master.id)
+    .where(Request.city_id == bindparam("city_id"))
+    .limit(10)
+)
+_STMT_REQUESTS_JOINED = (
+    select(Request, City, RequestType, Master)
+    .join(City, Request.city_id == City.id)
+    .join(RequestType, Request.request_type_id == RequestType.id)
+    .join(Master, Request.master_id == Master.id)
+    .where(Request.city_id == bindparam("city_id"))
+    .limit(20)
+)
+_STMT_REQUESTS_AGGREGATE = select(
+    func.count(Request.id),
+    func.sum(Request.result),
+    func.avg(Request.result),
+    func.max(Request.result),
+    func.min(Request.result)
+).where(Request.city_id == bindparam("city_id"))
+
+# Данные заявок не зависят от теста и считаются один раз при импорте модуля
+REQUEST_ROWS = 100
+_CLIENT_PHONES = tuple(f"+7999123456{i:03d}" for i in range(REQUEST_ROWS))
+_RESULT_AMOUNTS = tuple(Decimal(1000 + i * 10) for i in range(REQUEST_ROWS))
+
+
+def make_request_rows(seed: dict, count: int = REQUEST_ROWS) -> list:
+    """Строки заявок для Core insert по справочникам из seeded_requests"""
+    return [
+        {
+            "city_id": seed["city_id"],
+            "request_type_id": seed["request_type_id"],
+            "master_id": seed["master_id"],
+            "client_phone": _CLIENT_PHONES[i],
+            "client_name": f"Клиент {i}",
+            "address": f"Адрес {i}",
+            "problem": f"Проблема {i}",
+            "result": _RESULT_AMOUNTS[i]
+        }
+        for i in range(count)
+    ]
+
+
+def bench_stat(benchmark, name: str) -> float:
+    """Статистика замера в секундах; 0, если бенчмарки выключены"""
+    # pytest-benchmark выключает замеры под xdist и с --benchmark-disable: тогда
+    # функция выполняется один раз без статистики и проверяется только корректность
+    return 0.0 if benchmark.disabled else benchmark.stats[name]
+
+
+async def count_successes(coros, needed: int) -> int:
+    """Считает успешные запросы; если порог needed уже недостижим, остальные отменяет"""
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    success_count = 0
+    try:
+        for done_count, next_done in enumerate(asyncio.as_completed(tasks), start=1):
+            success_count += bool(await next_done)
+            # Даже если все оставшиеся запросы пройдут, порога не набрать
+            if success_count + len(tasks) - done_count < needed:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return success_count
+
+
+def run_sync(event_loop, coro_func):
+    """Оборачивает корутину в синхронный вызов для benchmark"""
+    return lambda: event_loop.run_until_complete(coro_func())
+
+
+@pytest.mark.benchmark(group="api")
 class TestAPIPerformance:
     """Тесты производительности API"""
     
-    async def test_health_check_performance(self, client: TestClient):
+    def test_health_check_performance(self, client: TestClient, benchmark):
         """Тест производительности health check"""
-        times = []
-        
-        # Делаем несколько запросов для получения средних значений
-        for _ in range(10):
-            with measure_time() as get_time:
-                response = client.get("/health")
-                assert response.status_code == 200
-            times.append(get_time())
-        
-        # Проверяем производительность
-        avg_time = sum(times) / len(times)
-        max_time = max(times)
+        # benchmark сам калибрует число итераций и отбрасывает выбросы
+        response = benchmark(client.get, "/health")
+        assert response.status_code == 200
         
         # Health check должен быть очень быстрым
-        assert avg_time < 0.1  # Средняя < 100ms
-        assert max_time < 0.5  # Максимальная < 500ms
-        
-        print(f"Health check - Average: {avg_time:.3f}s, Max: {max_time:.3f}s")
+        assert bench_stat(benchmark, "mean") < 0.1  # Средняя < 100ms
+        assert bench_stat(benchmark, "max") < 0.5   # Максимальная < 500ms
     
-    async def test_authentication_performance(self, client: TestClient, test_employee):
-        """Тест производительности аутентификации"""
+    @pytest.mark.benchmark(group="auth")
+    def test_authentication_performance(self, client: TestClient, test_employee, benchmark):
+        """Тест производительности холодного входа (с проверкой хеша пароля)"""
         login_data = {
             "login": test_employee.login,
             "password": "test_password"
         }
         
-        times = []
-        
-        # Тестируем несколько попыток входа
-        for _ in range(5):
-            with measure_time() as get_time:
-                response = client.post("/api/v1/auth/login", json=login_data)
-                assert response.status_code == 200
-            times.append(get_time())
-        
-        avg_time = sum(times) / len(times)
-        max_time = max(times)
+        # Хеширование пароля замеряется только здесь; остальные тесты получают
+        # готового пользователя из authenticated_client и не платят за bcrypt
+        response = benchmark.pedantic(
+            client.post, args=("/api/v1/auth/login",), kwargs={"json": login_data},
+            rounds=3, iterations=1
+        )
+        assert response.status_code == 200
         
         # Аутентификация должна быть быстрой
-        assert avg_time < 0.5  # Средняя < 500ms
-        assert max_time < 1.0  # Максимальная < 1s
-        
-        print(f"Authentication - Average: {avg_time:.3f}s, Max: {max_time:.3f}s")
+        assert bench_stat(benchmark, "mean") < 0.5  # Средняя < 500ms
+        assert bench_stat(benchmark, "max") < 1.0   # Максимальная < 1s
     
-    async def test_requests_list_performance(self, authenticated_client: TestClient):
+    def test_requests_list_performance(
+        self, authenticated_client: TestClient, db_session: AsyncSession, benchmark
+    ):
         """Тест производительности получения списка заявок"""
-        times = []
-        
-        for _ in range(5):
-            with measure_time() as get_time:
-                response = authenticated_client.get("/api/v1/requests/")
-                assert response.status_code == 200
-            times.append(get_time())
+        # Связи грузятся selectinload: число запросов не зависит от числа заявок
+        with count_queries(db_session.bind) as queries:
+            response = authenticated_client.get("/api/v1/requests/")
+            assert response.status_code == 200
+        assert queries[0] <= MAX_REQUESTS_LIST_QUERIES, f"N+1 suspected: {queries[0]} queries"
         
-        avg_time = sum(times) / len(times)
-        max_time = max(times)
+        response = benchmark.pedantic(
+            authenticated_client.get, args=("/api/v1/requests/",), rounds=5, iterations=1
+        )
+        assert response.status_code == 200
         
         # Получение списка должно быть быстрым
-        assert avg_time < 1.0  # Средняя < 1s
-        assert max_time < 2.0  # Максимальная < 2s
-        
-        print(f"Requests list - Average: {avg_time:.3f}s, Max: {max_time:.3f}s")
+        assert bench_stat(benchmark, "mean") < 1.0  # Средняя < 1s
+        assert bench_stat(benchmark, "max") < 2.0   # Максимальная < 2s
     
-    async def test_request_creation_performance(
+    def test_request_creation_performance(
         self, 
         authenticated_client: TestClient,
         test_city: City,
         test_request_type: RequestType,
-        test_master: Master
+        test_master: Master,
+        benchmark
     ):
         """Тест производительности создания заявок"""
         request_data = {
@@ -133,241 +249,66 @@ class TestAPIPerformance:
             "net_amount": 1200.00,
             "master_handover": 800.00
         }
+        phone_suffixes = iter(range(10))
         
-        times = []
+        def setup():
+            # Изменяем телефон для каждой заявки; подготовка не попадает в замер
+            payload = {**request_data, "client_phone": f"+7999123456{next(phone_suffixes)}"}
+            return ("/api/v1/requests/",), {"json": payload}
         
-        for i in range(5):
-            # Изменяем телефон для каждой заявки
-            request_data["client_phone"] = f"+7999123456{i}"
-            
-            with measure_time() as get_time:
-                response = authenticated_client.post("/api/v1/requests/", json=request_data)
-                assert response.status_code == 201
-            times.append(get_time())
-        
-        avg_time = sum(times) / len(times)
-        max_time = max(times)
+        response = benchmark.pedantic(authenticated_client.post, setup=setup, rounds=5, iterations=1)
+        assert response.status_code == 201
         
         # Создание заявки должно быть быстрым
-        assert avg_time < 0.5  # Средняя < 500ms
-        assert max_time < 1.0  # Максимальная < 1s
-        
-        print(f"Request creation - Average: {avg_time:.3f}s, Max: {max_time:.3f}s")
-
-
-@pytest.mark.asyncio
-class TestDatabasePerformance:
-    """Тесты производительности базы данных"""
-    
-    async def test_simple_query_performance(self, db_session: AsyncSession):
-        """Тест производительности простых запросов"""
-        times = []
-        
-        for _ in range(10):
-            with measure_time() as get_time:
-                result = await db_session.execute(select(City))
-                cities = result.scalars().all()
-            times.append(get_time())
-        
-        avg_time = sum(times) / len(times)
-        max_time = max(times)
-        
-        # Простые запросы должны быть очень быстрыми
-        assert avg_time < 0.05  # Средняя < 50ms
-        assert max_time < 0.1   # Максимальная < 100ms
-        
-        print(f"Simple query - Average: {avg_time:.3f}s, Max: {max_time:.3f}s")
-    
-    async def test_complex_query_performance(
-        self, 
-        db_session: AsyncSession,
-        test_city: City,
-        test_request_type: RequestType,
-        test_master: Master
-    ):
-        """Тест производительности сложных запросов"""
-        # Создаем тестовые данные
-        requests = []
-        for i in range(50):
-            request = Request(
-                city_id=test_city.id,
-                request_type_id=test_request_type.id,
-                master_id=test_master.id,
-                client_phone=f"+7999123456{i:02d}",
-                client_name=f"Клиент {i}",
-                address=f"Адрес {i}",
-                problem=f"Проблема {i}",
-                result=Decimal(f"{1000 + i * 10}.00")
-            )
-            requests.append(request)
-        
-        db_session.add_all(requests)
-        await db_session.commit()
-        
-        # Тестируем сложный запрос с соединениями
-        times = []
-        
-        for _ in range(5):
-            with measure_time() as get_time:
-                result = await db_session.execute(
-                    select(Request, City, RequestType, Master)
-                    .join(City, Request.city_id == City.id)
-                    .join(RequestType, Request.request_type_id == RequestType.id)
-                    .join(Master, Request.master_id == Master.id)
-                    .where(Request.city_id == test_city.id)
-                    .limit(20)
-                )
-                joined_data = result.all()
-            times.append(get_time())
-        
-        avg_time = sum(times) / len(times)
-        max_time = max(times)
-        
-        # Сложные запросы должны быть разумно быстрыми
-        assert avg_time < 0.2  # Средняя < 200ms
-        assert max_time < 0.5  # Максимальная < 500ms
-        
-        print(f"Complex query - Average: {avg_time:.3f}s, Max: {max_time:.3f}s")
-    
-    async def test_bulk_insert_performance(
-        self, 
-        db_session: AsyncSession,
-        test_city: City,
-        test_request_type: RequestType,
-        test_master: Master
-    ):
-        """Тест производительности массовой вставки"""
-        # Создаем много записей
-        requests = []
-        for i in range(100):
-            request = Request(
-                city_id=test_city.id,
-                request_type_id=test_request_type.id,
-                master_id=test_master.id,
-                client_phone=f"+7999123456{i:03d}",
-                client_name=f"Клиент {i}",
-                address=f"Адрес {i}",
-                problem=f"Проблема {i}"
-            )
-            requests.append(request)
-        
-        # Измеряем время вставки
-        with measure_time() as get_time:
-            db_session.add_all(requests)
-            await db_session.commit()
-        
-        insert_time = get_time()
-        
-        # Массовая вставка должна быть эффективной
-        assert insert_time < 2.0  # Меньше 2 секунд для 100 записей
-        
-        # Проверяем что все записи созданы
-        result = await db_session.execute(
-            select(func.count(Request.id)).where(Request.city_id == test_city.id)
-        )
-        count = result.scalar()
-        
-        assert count >= 100
-        
-        print(f"Bulk insert (100 records) - Time: {insert_time:.3f}s")
-    
-    async def test_aggregation_performance(
-        self, 
-        db_session: AsyncSession,
-        test_city: City,
-        test_request_type: RequestType,
-        test_master: Master
-    ):
-        """Тест производительности агрегационных запросов"""
-        # Создаем тестовые данные
-        requests = []
-        for i in range(100):
-            request = Request(
-                city_id=test_city.id,
-                request_type_id=test_request_type.id,
-                master_id=test_master.id,
-                client_phone=f"+7999123456{i:03d}",
-                client_name=f"Клиент {i}",
-                address=f"Адрес {i}",
-                problem=f"Проблема {i}",
-                result=Decimal(f"{1000 + i * 10}.00")
-            )
-            requests.append(request)
-        
-        db_session.add_all(requests)
-        await db_session.commit()
-        
-        # Тестируем агрегационные запросы
-        times = []
-        
-        for _ in range(5):
-            with measure_time() as get_time:
-                result = await db_session.execute(
-                    select(
-                        func.count(Request.id),
-                        func.sum(Request.result),
-                        func.avg(Request.result),
-                        func.max(Request.result),
-                        func.min(Request.result)
-                    ).where(Request.city_id == test_city.id)
-                )
-                stats = result.first()
-            times.append(get_time())
-        
-        avg_time = sum(times) / len(times)
-        max_time = max(times)
-        
-        # Агрегационные запросы должны быть быстрыми
-        assert avg_time < 0.1  # Средняя < 100ms
-        assert max_time < 0.2  # Максимальная < 200ms
-        
-        print(f"Aggregation query - Average: {avg_time:.3f}s, Max: {max_time:.3f}s")
+        assert bench_stat(benchmark, "mean") < 0.5  # Средняя < 500ms
+        assert bench_stat(benchmark, "max") < 1.0   # Максимальная < 1s
 
 
+# Проверяют время без benchmark, поэтому под xdist выполняются на одном воркере
+@pytest.mark.xdist_group("perf")
 @pytest.mark.asyncio
 class TestConcurrencyPerformance:
     """Тесты производительности при конкурентном доступе"""
     
-    async def test_concurrent_requests(self, client: TestClient):
-        """Тест конкурентных запросов"""
-        def make_request():
-            response = client.get("/health")
+    @pytest.mark.benchmark(group="concurrency-scan")
+    @pytest.mark.parametrize("concurrency", [1, 4, 16, 64, 256])
+    def test_concurrent_requests(
+        self, async_client: httpx.AsyncClient, event_loop, benchmark, concurrency: int
+    ):
+        """Тест конкурентных запросов: кривая пропускной способности по уровням конкурентности"""
+        async def make_request():
+            response = await async_client.get("/health")
             return response.status_code == 200
         
-        # Запускаем 20 конкурентных запросов
-        with ThreadPoolExecutor(max_workers=20) as executor:
-            with measure_time() as get_time:
-                futures = [executor.submit(make_request) for _ in range(20)]
-                results = [future.result() for future in as_completed(futures)]
+        async def run():
+            # Все запросы уровня идут одновременно прямо в event loop, без потоков
+            return await asyncio.gather(*(make_request() for _ in range(concurrency)))
         
-        total_time = get_time()
+        results = benchmark.pedantic(run_sync(event_loop, run), rounds=5, iterations=1, warmup_rounds=1)
         success_count = sum(results)
+        if not benchmark.disabled:
+            benchmark.extra_info["rps"] = concurrency / bench_stat(benchmark, "mean")
         
         # Проверяем результаты
-        assert success_count >= 18  # Минимум 90% успешных запросов
-        assert total_time < 5.0     # Все запросы должны завершиться за 5 секунд
-        
-        print(f"Concurrent requests (20) - Success: {success_count}/20, Time: {total_time:.3f}s")
+        assert success_count >= concurrency * 0.9       # Минимум 90% успешных запросов
+        assert bench_stat(benchmark, "max") < 5.0       # Все запросы должны завершиться за 5 секунд
     
-    async def test_concurrent_authentication(self, client: TestClient, test_employee):
+    async def test_concurrent_authentication(self, async_client: httpx.AsyncClient, test_employee):
         """Тест конкурентной аутентификации"""
         login_data = {
             "login": test_employee.login,
             "password": "test_password"
         }
         
-        def authenticate():
-            response = client.post("/api/v1/auth/login", json=login_data)
+        async def authenticate():
+            response = await async_client.post("/api/v1/auth/login", json=login_data)
             return response.status_code == 200
         
         # Запускаем 10 конкурентных аутентификаций
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            with measure_time() as get_time:
-                futures = [executor.submit(authenticate) for _ in range(10)]
-                results = [future.result() for future in as_completed(futures)]
+        with measure_time() as get_time:
+            success_count = await count_successes((authenticate() for _ in range(10)), needed=9)
         
         total_time = get_time()
-        success_count = sum(results)
         
         # Проверяем результаты
         assert success_count >= 9   # Минимум 90% успешных аутентификаций
@@ -380,13 +321,14 @@ class TestConcurrencyPerformance:
         db_session: AsyncSession,
         test_city: City,
         test_request_type: RequestType,
-        test_master: Master
+        test_master: Master,
+        session_factory: async_sessionmaker
     ):
         """Тест конкурентных операций с базой данных"""
         async def create_request_async(session_id):
-            # Создаем новую сессию для каждого потока
-            from app.core.database import AsyncSessionLocal
-            async with AsyncSessionLocal() as session:
+            # Создаем новую сессию для каждой операции; соединения пула
+            # уже открыты фикстурой warm_connection_pool
+            async with session_factory() as session:
                 request = Request(
                     city_id=test_city.id,
                     request_type_id=test_request_type.id,
@@ -421,127 +363,167 @@ class TestMemoryPerformance:
     
     async def test_memory_usage_normal_operations(self, authenticated_client: TestClient):
         """Тест использования памяти при нормальных операциях"""
+        # RSS процесса только для справки: он зависит от того, вернул ли аллокатор память ОС
+        rss_before = _PROCESS.memory_info().rss
         with measure_memory() as get_memory_diff:
             # Выполняем серию операций
             for i in range(50):
                 response = authenticated_client.get("/api/v1/requests/")
                 assert response.status_code == 200
         
-        memory_diff = get_memory_diff()
+        memory_diff, _ = get_memory_diff()
+        rss_diff = (_PROCESS.memory_info().rss - rss_before) / 1024 / 1024
         
         # Использование памяти должно быть разумным
         assert memory_diff < 50  # Меньше 50MB для 50 запросов
         
-        print(f"Memory usage (50 requests) - Diff: {memory_diff:.2f}MB")
+        print(f"Memory usage (50 requests) - Diff: {memory_diff:.2f}MB, RSS diff: {rss_diff:.2f}MB")
     
-    async def test_memory_leak_detection(self, authenticated_client: TestClient):
+    async def test_memory_leak_detection(self, async_client: httpx.AsyncClient):
         """Тест обнаружения утечек памяти"""
-        memory_measurements = []
-        
-        for iteration in range(5):
-            # Делаем много запросов
-            for i in range(100):
-                response = authenticated_client.get("/health")
+        async def make_requests():
+            responses = await asyncio.gather(*(async_client.get("/health") for _ in range(100)))
+            for response in responses:
                 assert response.status_code == 200
+            # Циклические ссылки (Task/Future) освобождает только сборщик мусора;
+            # несколько проходов добирают объекты, воскрешенные финализаторами
+            for _ in range(3):
+                gc.collect()
+        
+        # Пиковый RSS ловит аллокации C-расширений, которые не видит tracemalloc
+        maxrss_measurements = []
+        traced_measurements = []
+        
+        tracemalloc.start()
+        try:
+            # Прогрев: первая серия заполняет кеши приложения
+            await make_requests()
+            previous = tracemalloc.take_snapshot()
             
-            # Измеряем память
-            process = psutil.Process(os.getpid())
-            memory_mb = process.memory_info().rss / 1024 / 1024
-            memory_measurements.append(memory_mb)
-            
-            # Небольшая пауза между итерациями
-            await asyncio.sleep(0.1)
-        
-        # Проверяем что память не растет постоянно
-        for i in range(1, len(memory_measurements)):
-            memory_growth = memory_measurements[i] - memory_measurements[i-1]
+            for iteration in range(4):
+                await make_requests()
+                traced_measurements.append(tracemalloc.get_traced_memory()[0] / 1024 / 1024)
+                
+                snapshot = tracemalloc.take_snapshot()
+                growth = snapshot.compare_to(previous, "lineno")
+                previous = snapshot
+                
+                # Ни одна строка кода не должна наращивать память от серии к серии
+                for stat in growth:
+                    assert stat.size_diff < 1024 * 1024, f"Memory leak suspected: {stat}"
+                
+                if HAS_RESOURCE:
+                    # ru_maxrss в Linux отдается в килобайтах
+                    maxrss_measurements.append(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+        finally:
+            tracemalloc.stop()
+        
+        # Проверяем что память Python после сборки мусора не растет
+        for i in range(1, len(traced_measurements)):
+            memory_growth = traced_measurements[i] - traced_measurements[i-1]
+            assert memory_growth < 1  # Рост не более 1MB между итерациями
+        
+        # Проверяем что пиковый RSS не растет постоянно
+        for i in range(1, len(maxrss_measurements)):
+            memory_growth = maxrss_measurements[i] - maxrss_measurements[i-1]
             assert memory_growth < 20  # Рост не более 20MB между итерациями
         
-        print(f"Memory leak test - Measurements: {memory_measurements}")
+        print(f"Memory leak test - Traced: {traced_measurements}, Max RSS: {maxrss_measurements}")
     
+    @pytest.mark.skipif(not HAS_IJSON, reason="ijson не установлен")
     async def test_large_response_memory(self, authenticated_client: TestClient):
         """Тест использования памяти при больших ответах"""
+        item_count = 0
+        
         with measure_memory() as get_memory_diff:
-            # Запрашиваем большой список (если есть данные)
-            response = authenticated_client.get("/api/v1/requests/?limit=1000")
-            assert response.status_code == 200
-            
-            data = response.json()
-            # Обрабатываем данные
-            processed_data = [item for item in data if item]
+            # Запрашиваем большой список (если есть данные) и разбираем его
+            # потоково, не собирая распарсенный список целиком. TestClient все равно
+            # буферизует тело, а tracemalloc учитывает и работу сервера (ORM, сериализацию)
+            items = ijson.sendable_list()
+            parser = ijson.items_coro(items, "item")
+            with authenticated_client.stream("GET", "/api/v1/requests/?limit=1000") as response:
+                assert response.status_code == 200
+                for chunk in response.iter_bytes(65536):
+                    parser.send(chunk)
+                    # Обрабатываем данные
+                    item_count += sum(1 for item in items if item)
+                    del items[:]
+            parser.close()
         
-        memory_diff = get_memory_diff()
+        memory_diff, memory_peak = get_memory_diff()
         
         # Использование памяти должно быть пропорциональным размеру данных
         assert memory_diff < 100  # Меньше 100MB для больших ответов
         
-        print(f"Large response memory - Diff: {memory_diff:.2f}MB")
+        print(f"Large response memory ({item_count} items) - Diff: {memory_diff:.2f}MB, Peak: {memory_peak:.2f}MB")
 
 
-@pytest.mark.asyncio
+@pytest.mark.benchmark(group="cache")
 class TestCachePerformance:
     """Тесты производительности кеширования"""
     
-    @patch('app.core.cache.cache_manager')
-    async def test_cache_hit_performance(self, mock_cache, authenticated_client: TestClient):
+    def test_cache_hit_performance(self, local_cache: CacheManager, event_loop, benchmark):
         """Тест производительности попаданий в кеш"""
-        # Настраиваем мок кеша
-        mock_cache.get.return_value = '{"cached": "data"}'
-        mock_cache.set.return_value = True
-        
-        times_with_cache = []
-        
-        # Тестируем запросы с кешем
-        for _ in range(10):
-            with measure_time() as get_time:
-                response = authenticated_client.get("/api/v1/requests/")
-                assert response.status_code == 200
-            times_with_cache.append(get_time())
-        
-        avg_time_with_cache = sum(times_with_cache) / len(times_with_cache)
+        event_loop.run_until_complete(local_cache.set("requests", {"cached": "data"}))
         
-        # Запросы с кешем должны быть быстрыми
-        assert avg_time_with_cache < 0.1  # Средняя < 100ms
+        # Замеряется только слой кеша, без ASGI, авторизации и сериализации ответа
+        value = benchmark.pedantic(
+            run_sync(event_loop, lambda: local_cache.get("requests")), rounds=1000, iterations=1
+        )
+        assert value == {"cached": "data"}
         
-        print(f"Cache hit performance - Average: {avg_time_with_cache:.3f}s")
+        # Попадание в кеш должно быть очень быстрым
+        assert bench_stat(benchmark, "mean") < 0.001  # Средняя < 1ms
     
-    @patch('app.core.cache.cache_manager')
-    async def test_cache_miss_performance(self, mock_cache, authenticated_client: TestClient):
+    def test_cache_miss_performance(self, local_cache: CacheManager, event_loop, benchmark):
         """Тест производительности промахов кеша"""
-        # Настраиваем мок кеша (промахи)
-        mock_cache.get.return_value = None
-        mock_cache.set.return_value = True
+        value = benchmark.pedantic(
+            run_sync(event_loop, lambda: local_cache.get("missing")), rounds=1000, iterations=1
+        )
+        assert value is None
         
-        times_without_cache = []
+        # Промах кеша должен быть очень быстрым
+        assert bench_stat(benchmark, "mean") < 0.001  # Средняя < 1ms
+    
+    def test_cache_set_performance(self, local_cache: CacheManager, event_loop, benchmark):
+        """Тест производительности записи в кеш"""
+        result = benchmark.pedantic(
+            run_sync(event_loop, lambda: local_cache.set("requests", {"cached": "data"})),
+            rounds=1000, iterations=1
+        )
+        assert result is True
         
-        # Тестируем запросы без кеша
-        for _ in range(5):
-            with measure_time() as get_time:
+        # Запись в кеш должна быть очень быстрой
+        assert bench_stat(benchmark, "mean") < 0.001  # Средняя < 1ms
+    
+    async def test_requests_list_with_local_cache(self, authenticated_client: TestClient):
+        """Интеграционный тест: список заявок при локальном кеше вместо Redis"""
+        # Настоящий словарь вместо мока, чтобы await шел через реальный код кеша
+        with patch.object(cache_manager, "redis_client", None), \
+                patch.object(cache_manager, "local_cache", {}):
+            for _ in range(2):
                 response = authenticated_client.get("/api/v1/requests/")
                 assert response.status_code == 200
-            times_without_cache.append(get_time())
-        
-        avg_time_without_cache = sum(times_without_cache) / len(times_without_cache)
-        
-        # Запросы без кеша должны быть разумно быстрыми
-        assert avg_time_without_cache < 1.0  # Средняя < 1s
-        
-        print(f"Cache miss performance - Average: {avg_time_without_cache:.3f}s")
 
 
+# Проверяют время без benchmark, поэтому под xdist выполняются на одном воркере
+@pytest.mark.xdist_group("perf")
 @pytest.mark.asyncio
 class TestLoadTesting:
     """Нагрузочные тесты"""
     
-    async def test_sustained_load(self, client: TestClient):
+    async def test_sustained_load(self, async_client: httpx.AsyncClient):
         """Тест устойчивой нагрузки"""
-        def make_sustained_requests():
+        async def make_sustained_requests():
             success_count = 0
             error_count = 0
+            # Дедлайны считаем от монотонных часов: опоздание сна не накапливается
+            # и темп держится на 100 запросах в секунду
+            next_deadline = time.monotonic()
             
             for i in range(100):
                 try:
-                    response = client.get("/health")
+                    response = await async_client.get("/health")
                     if response.status_code == 200:
                         success_count += 1
                     else:
@@ -549,56 +531,53 @@ class TestLoadTesting:
                 except Exception:
                     error_count += 1
                 
-                # Небольшая задержка между запросами
-                time.sleep(0.01)
+                # Ждем до следующего дедлайна, а не фиксированные 10ms после запроса
+                next_deadline += 0.01
+                delay = next_deadline - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
             
             return success_count, error_count
         
-        # Запускаем 5 потоков с устойчивой нагрузкой
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            with measure_time() as get_time:
-                futures = [executor.submit(make_sustained_requests) for _ in range(5)]
-                results = [future.result() for future in as_completed(futures)]
+        # Запускаем 5 параллельных потоков запросов с устойчивой нагрузкой
+        with measure_time() as get_time:
+            results = await asyncio.gather(*(make_sustained_requests() for _ in range(5)))
         
         total_time = get_time()
         total_success = sum(success for success, _ in results)
         total_errors = sum(errors for _, errors in results)
         
         # Проверяем результаты
-        success_rate = total_success / (total_success + total_errors) * 100
+        total_requests = total_success + total_errors
+        success_rate = total_success / total_requests * 100
+        achieved_rps = total_requests / total_time
         
         assert success_rate >= 95  # Минимум 95% успешных запросов
         assert total_time < 60     # Все запросы должны завершиться за 60 секунд
         
-        print(f"Sustained load test - Success rate: {success_rate:.1f}%, Time: {total_time:.1f}s")
+        print(f"Sustained load test - Success rate: {success_rate:.1f}%, Time: {total_time:.1f}s, RPS: {achieved_rps:.0f}")
     
-    async def test_spike_load(self, client: TestClient):
+    async def test_spike_load(self, async_client: httpx.AsyncClient):
         """Тест пиковой нагрузки"""
-        def make_spike_requests():
-            success_count = 0
-            
-            # Быстрые запросы без задержек
-            for i in range(50):
+        # Не более 10 запросов одновременно (пиковая нагрузка)
+        semaphore = asyncio.Semaphore(10)
+        
+        async def make_spike_request():
+            async with semaphore:
                 try:
-                    response = client.get("/health")
-                    if response.status_code == 200:
-                        success_count += 1
+                    response = await async_client.get("/health")
+                    return response.status_code == 200
                 except Exception:
-                    pass
-            
-            return success_count
+                    return False
         
-        # Запускаем 10 потоков одновременно (пиковая нагрузка)
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            with measure_time() as get_time:
-                futures = [executor.submit(make_spike_requests) for _ in range(10)]
-                results = [future.result() for future in as_completed(futures)]
+        # Быстрые запросы без задержек: 500 штук
+        with measure_time() as get_time:
+            total_success = await count_successes((make_spike_request() for _ in range(500)), needed=400)
         
         total_time = get_time()
-        total_success = sum(results)
         
         # Проверяем результаты
-        success_rate = total_success / 500 * 100  # 10 потоков * 50 запросов
+        success_rate = total_success / 500 * 100
         
         assert success_rate >= 80  # Минимум 80% успешных запросов при пиковой нагрузке
         assert total_time < 30     # Все запросы должны завершиться за 30 секунд
@@ -606,114 +585,249 @@ class TestLoadTesting:
         print(f"Spike load test - Success rate: {success_rate:.1f}%, Time: {total_time:.1f}s")
 
 
-@pytest.mark.asyncio
+@pytest.mark.benchmark(group="baseline")
 class TestPerformanceRegression:
     """Тесты регрессии производительности"""
     
-    async def test_performance_baseline(self, authenticated_client: TestClient):
+    # Набор стандартных операций: (имя, url, предел средней, предел максимума)
+    @pytest.mark.parametrize("operation_name,url,avg_limit,max_limit", [
+        ("health_check", "/health", 0.1, 0.2),
+        ("requests_list", "/api/v1/requests/", 1.0, 2.0),
+        ("cities_list", "/api/v1/requests/cities", 0.5, 1.0),
+        ("types_list", "/api/v1/requests/request-types", 0.5, 1.0),
+        ("masters_list", "/api/v1/requests/masters", 0.5, 1.0),
+    ])
+    # serial — задержка одиночного запроса, parallel — 5 одновременных запросов
+    @pytest.mark.parametrize("mode", ["serial", "parallel"])
+    def test_performance_baseline(
+        self,
+        authenticated_client: TestClient,
+        asgi_transport: httpx.ASGITransport,
+        session_factory: async_sessionmaker,
+        event_loop,
+        benchmark,
+        mode: str,
+        operation_name: str,
+        url: str,
+        avg_limit: float,
+        max_limit: float
+    ):
         """Тест базовой производительности для отслеживания регрессий"""
-        # Набор стандартных операций
-        operations = [
-            ("health_check", lambda: authenticated_client.get("/health")),
-            ("requests_list", lambda: authenticated_client.get("/api/v1/requests/")),
-            ("cities_list", lambda: authenticated_client.get("/api/v1/requests/cities")),
-            ("types_list", lambda: authenticated_client.get("/api/v1/requests/request-types")),
-            ("masters_list", lambda: authenticated_client.get("/api/v1/requests/masters")),
-        ]
-        
-        performance_results = {}
-        
-        for operation_name, operation_func in operations:
-            times = []
+        # Результаты сохраняются через --benchmark-autosave и сравниваются --benchmark-compare
+        if mode == "parallel" and isinstance(session_factory.kw["bind"].pool, StaticPool):
+            # У SQLite одно соединение, и его транзакцию держит сессия authenticated_client:
+            # одновременные запросы пришлось бы выполнять по очереди, как в serial
+            pytest.skip("Параллельный режим требует пула соединений (Postgres)")
+        
+        if mode == "serial":
+            response = benchmark.pedantic(authenticated_client.get, args=(url,), rounds=5, iterations=1)
+            assert response.status_code == 200
+            avg_time, max_time = bench_stat(benchmark, "mean"), bench_stat(benchmark, "max")
+        else:
+            # Тот же пользователь: переносим cookie и заголовки авторизации в AsyncClient
+            async_client = httpx.AsyncClient(
+                transport=asgi_transport,
+                base_url=authenticated_client.base_url,
+                headers=authenticated_client.headers,
+                cookies=authenticated_client.cookies,
+            )
+            latencies = []
             
-            # Выполняем операцию несколько раз
-            for _ in range(5):
-                with measure_time() as get_time:
-                    response = operation_func()
-                    assert response.status_code == 200
-                times.append(get_time())
+            # Одну AsyncSession нельзя использовать конкурентно, поэтому каждый
+            # одновременный запрос получает свою сессию из session_factory
+            async def concurrent_db():
+                async with session_factory() as session:
+                    yield session
             
-            avg_time = sum(times) / len(times)
-            max_time = max(times)
+            shared_db = app.dependency_overrides[get_db]
+            app.dependency_overrides[get_db] = concurrent_db
             
-            performance_results[operation_name] = {
-                "average": avg_time,
-                "maximum": max_time
-            }
-        
-        # Проверяем что производительность в пределах нормы
-        performance_limits = {
-            "health_check": {"average": 0.1, "maximum": 0.2},
-            "requests_list": {"average": 1.0, "maximum": 2.0},
-            "cities_list": {"average": 0.5, "maximum": 1.0},
-            "types_list": {"average": 0.5, "maximum": 1.0},
-            "masters_list": {"average": 0.5, "maximum": 1.0},
-        }
-        
-        for operation_name, results in performance_results.items():
-            limits = performance_limits[operation_name]
+            async def bench_op():
+                responses = await asyncio.gather(*(async_client.get(url) for _ in range(5)))
+                for response in responses:
+                    assert response.status_code == 200
+                    latencies.append(response.elapsed.total_seconds())
             
-            assert results["average"] < limits["average"], \
-                f"{operation_name} average time {results['average']:.3f}s exceeds limit {limits['average']:.3f}s"
-            assert results["maximum"] < limits["maximum"], \
-                f"{operation_name} maximum time {results['maximum']:.3f}s exceeds limit {limits['maximum']:.3f}s"
-        
-        # Выводим результаты для мониторинга
-        print("Performance baseline results:")
-        for operation_name, results in performance_results.items():
-            print(f"  {operation_name}: avg={results['average']:.3f}s, max={results['maximum']:.3f}s")
+            try:
+                benchmark.pedantic(run_sync(event_loop, bench_op), rounds=3, iterations=1)
+            finally:
+                app.dependency_overrides[get_db] = shared_db
+                event_loop.run_until_complete(async_client.aclose())
+            # Та же статистика, что у benchmark в serial: среднее и максимум
+            avg_time, max_time = statistics.mean(latencies), max(latencies)
+        
+        assert avg_time < avg_limit, \
+            f"{operation_name} average time {avg_time:.3f}s exceeds limit {avg_limit:.3f}s"
+        assert max_time < max_limit, \
+            f"{operation_name} maximum time {max_time:.3f}s exceeds limit {max_limit:.3f}s"
     
-    async def test_database_performance_baseline(
+    @pytest.mark.benchmark(group="db-baseline")
+    @pytest.mark.parametrize("operation,limit", [
+        ("insert", 0.2),         # Вставка 100 записей < 200ms
+        ("simple_query", 0.1),   # Простой запрос < 100ms
+        ("complex_query", 0.2),  # Сложный запрос < 200ms
+    ])
+    def test_database_performance_baseline(
         self, 
-        db_session: AsyncSession,
-        test_city: City,
-        test_request_type: RequestType,
-        test_master: Master
+        nested_session: AsyncSession,
+        seeded_requests: dict,
+        event_loop,
+        benchmark,
+        operation: str,
+        limit: float
     ):
         """Тест базовой производительности базы данных"""
-        # Создаем тестовые данные
-        requests = []
-        for i in range(100):
-            request = Request(
-                city_id=test_city.id,
-                request_type_id=test_request_type.id,
-                master_id=test_master.id,
-                client_phone=f"+7999123456{i:03d}",
-                client_name=f"Клиент {i}",
-                address=f"Адрес {i}",
-                problem=f"Проблема {i}"
-            )
-            requests.append(request)
+        rows = make_request_rows(seeded_requests)
         
-        # Тест вставки
-        with measure_time() as get_time:
-            db_session.add_all(requests)
-            await db_session.commit()
-        insert_time = get_time()
+        async def insert_rows():
+            # Одна Core-вставка пачкой вместо add_all и ORM flush
+            await nested_session.execute(insert(Request), rows)
+            await nested_session.commit()
         
-        # Тест простого запроса
-        with measure_time() as get_time:
-            result = await db_session.execute(
-                select(Request).where(Request.city_id == test_city.id).limit(10)
+        async def simple_query():
+            result = await nested_session.execute(
+                _STMT_REQUESTS_BY_CITY, {"city_id": seeded_requests["city_id"]}
             )
-            simple_results = result.scalars().all()
-        simple_query_time = get_time()
+            return result.scalars().all()
         
-        # Тест сложного запроса
-        with measure_time() as get_time:
-            result = await db_session.execute(
-                select(Request, City, Master)
-                .join(City, Request.city_id == City.id)
-                .join(Master, Request.master_id == Master.id)
-                .where(Request.city_id == test_city.id)
-                .limit(10)
+        async def complex_query():
+            result = await nested_session.execute(
+                _STMT_REQUESTS_WITH_MASTER, {"city_id": seeded_requests["city_id"]}
             )
-            complex_results = result.all()
-        complex_query_time = get_time()
+            return result.all()
+        
+        if operation == "insert":
+            benchmark.pedantic(run_sync(event_loop, insert_rows), rounds=5, iterations=1)
+        else:
+            # Запросы читают заявки, заполненные один раз на модуль
+            query = simple_query if operation == "simple_query" else complex_query
+            benchmark.pedantic(run_sync(event_loop, query), rounds=10, iterations=1, warmup_rounds=2)
         
         # Проверяем производительность
-        assert insert_time < 2.0        # Вставка 100 записей < 2s
-        assert simple_query_time < 0.1  # Простой запрос < 100ms
-        assert complex_query_time < 0.2 # Сложный запрос < 200ms
+        assert bench_stat(benchmark, "mean") < limit, \
+            f"{operation} average time {bench_stat(benchmark, 'mean'):.3f}s exceeds limit {limit:.3f}s"
+
+
+@pytest.mark.benchmark(group="db-query")
+class TestDatabasePerformance:
+    """Тесты производительности базы данных"""
+    
+    def test_simple_query_performance(self, nested_session: AsyncSession, event_loop, benchmark):
+        """Тест производительности простых запросов"""
+        async def query():
+            result = await nested_session.execute(_STMT_ALL_CITIES)
+            return result.scalars().all()
+        
+        benchmark.pedantic(run_sync(event_loop, query), rounds=10, iterations=1, warmup_rounds=2)
         
-        print(f"Database baseline - Insert: {insert_time:.3f}s, Simple: {simple_query_time:.3f}s, Complex: {complex_query_time:.3f}s") 
\ No newline at end of file
+        # Простые запросы должны быть очень быстрыми
+        assert bench_stat(benchmark, "mean") < 0.05  # Средняя < 50ms
+        assert bench_stat(benchmark, "max") < 0.1    # Максимальная < 100ms
+    
+    def test_complex_query_performance(
+        self, 
+        nested_session: AsyncSession,
+        seeded_requests: dict,
+        event_loop,
+        benchmark
+    ):
+        """Тест производительности сложных запросов"""
+        # Тестируем сложный запрос с соединениями на общих данных модуля
+        async def query():
+            result = await nested_session.execute(
+                _STMT_REQUESTS_JOINED, {"city_id": seeded_requests["city_id"]}
+            )
+            return result.all()
+        
+        benchmark.pedantic(run_sync(event_loop, query), rounds=10, iterations=1, warmup_rounds=2)
+        
+        # Все соединения приходят одним SELECT, без догрузки связей по строкам (N+1)
+        with count_queries(nested_session.bind) as queries:
+            joined_data = event_loop.run_until_complete(query())
+        assert queries[0] == 1
+        assert len(joined_data) == 20
+        
+        # Сложные запросы должны быть разумно быстрыми
+        assert bench_stat(benchmark, "mean") < 0.2  # Средняя < 200ms
+        assert bench_stat(benchmark, "max") < 0.5   # Максимальная < 500ms
+    
+    @pytest.mark.benchmark(group="db-insert")
+    def test_bulk_insert_performance(
+        self, 
+        nested_session: AsyncSession,
+        seeded_requests: dict,
+        event_loop,
+        benchmark
+    ):
+        """Тест производительности массовой вставки"""
+        # Строки готовим до замера; Core insert отправляет их одним executemany
+        # без ORM-объектов и unit of work
+        rows = make_request_rows(seeded_requests)
+        
+        async def insert_rows():
+            await nested_session.execute(insert(Request), rows)
+            await nested_session.commit()
+        
+        benchmark.pedantic(run_sync(event_loop, insert_rows), rounds=5, iterations=1)
+        
+        # Массовая вставка должна быть эффективной
+        assert bench_stat(benchmark, "mean") < 0.2  # Меньше 200ms для 100 записей
+        
+        # Проверяем что все записи созданы
+        result = event_loop.run_until_complete(nested_session.execute(
+            select(func.count(Request.id)).where(Request.city_id == seeded_requests["city_id"])
+        ))
+        count = result.scalar()
+        
+        assert count >= seeded_requests["count"] + 100
+    
+    def test_aggregation_performance(
+        self, 
+        nested_session: AsyncSession,
+        seeded_requests: dict,
+        event_loop,
+        benchmark
+    ):
+        """Тест производительности агрегационных запросов"""
+        # Тестируем агрегационные запросы
+        async def query():
+            result = await nested_session.execute(
+                _STMT_REQUESTS_AGGREGATE, {"city_id": seeded_requests["city_id"]}
+            )
+            return result.first()
+        
+        stats = benchmark.pedantic(run_sync(event_loop, query), rounds=10, iterations=1, warmup_rounds=2)
+        assert stats[0] == seeded_requests["count"]
+        
+        # Агрегационные запросы должны быть быстрыми
+        assert bench_stat(benchmark, "mean") < 0.1  # Средняя < 100ms
+        assert bench_stat(benchmark, "max") < 0.2   # Максимальная < 200ms
+
+
+@pytest.fixture(scope="module")
+async def seeded_requests(seeded_connection: AsyncConnection, seeded_ids: dict) -> dict:
+    """Мастер и 100 заявок, вставленные один раз на модуль поверх справочников"""
+    seed = {
+        "city_id": seeded_ids["cities"]["Тестовый город"],
+        "request_type_id": seeded_ids["request_types"]["Тестовый тип"],
+        "count": REQUEST_ROWS,
+    }
+    # Мастер только фигурирует в заявках и не входит в систему, хеш пароля не нужен
+    seed["master_id"] = await seeded_connection.scalar(
+        insert(Master).returning(Master.id),
+        {
+            "city_id": seed["city_id"],
+            "full_name": "Тестовый мастер",
+            "phone_number": "1111111111",
+            "login": "perf_master",
+            "password_hash": "!",
+        }
+    )
+    await seeded_connection.execute(insert(Request), make_request_rows(seed, seed["count"]))
+    return seed
+
+
+@pytest.fixture
+def local_cache() -> CacheManager:
+    """Менеджер кеша без Redis: значения хранятся в локальном словаре"""
+    return CacheManager()
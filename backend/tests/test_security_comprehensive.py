@@ -8,16 +8,37 @@ from unittest.mock import patch, MagicMock, AsyncMock
 import time
 from datetime import datetime, timedelta
 import jwt
+import time_machine
 
 from app.core.security import (
-    CSRFProtection, LoginAttemptTracker, sanitize_output,
+    CSRFProtection, LoginAttemptTracker, sanitize_output, login_attempts,
     SecurityHeadersMiddleware, RequestSizeLimitMiddleware
 )
 from app.core.auth import (
     create_access_token, verify_token, get_password_hash, 
-    verify_password, authenticate_user
+    verify_password, authenticate_user,
+    TOKEN_CACHE_TTL, _token_cache, _token_cache_lock, _token_cache_ttu
 )
-from app.core.models import Employee, Master, Administrator
+from app.core.models import Employee, Master, Administrator, Role
+from app.core.config import settings
+
+# Лимит RequestSizeLimitMiddleware по умолчанию
+MAX_REQUEST_SIZE = 10 * 1024 * 1024
+
+# IP, с которого приходят запросы TestClient
+TEST_CLIENT_IP = "testclient"
+
+# Входные данные санитизации - литералы, поэтому результат считается один раз при импорте
+_SAFE_DICT = sanitize_output({
+    "name": "<script>alert('XSS')</script>",
+    "description": "Нормальное описание",
+    "html": "<div>Контент</div>"
+})
+_SAFE_LIST = sanitize_output([
+    "<script>alert('XSS')</script>",
+    "Безопасный текст",
+    "<img src=x onerror=alert(1)>"
+])
 
 
 @pytest.mark.asyncio
@@ -152,7 +173,10 @@ class TestLoginAttemptTracker:
         assert failed_count == 1
 
 
+# Хеши hashed_passwords считаются один раз на воркер, поэтому тесты паролей
+# под xdist собраны на одном воркере
 @pytest.mark.asyncio
+@pytest.mark.xdist_group("passwords")
 class TestPasswordSecurity:
     """Тесты безопасности паролей"""
     
@@ -172,10 +196,11 @@ class TestPasswordSecurity:
         hashed2 = get_password_hash(password)
         assert hashed != hashed2
     
-    def test_password_verification(self):
+    @pytest.mark.usefixtures("fast_pwd_context")
+    def test_password_verification(self, hashed_passwords: dict):
         """Тест проверки паролей"""
         password = "test_password_123"
-        hashed = get_password_hash(password)
+        hashed = hashed_passwords[password]
         
         # Правильный пароль
         assert verify_password(password, hashed) is True
@@ -186,47 +211,40 @@ class TestPasswordSecurity:
         # Пустой пароль
         assert verify_password("", hashed) is False
     
-    def test_password_strength_requirements(self):
-        """Тест требований к сложности пароля"""
+    # Все пароли должны хешироваться (логика проверки сложности на уровне валидации)
+    @pytest.mark.parametrize("password", [
         # Слабые пароли
-        weak_passwords = [
-            "123",
-            "password",
-            "12345678",
-            "qwerty",
-            "admin"
-        ]
-        
+        "123",
+        "password",
+        "12345678",
+        "qwerty",
+        "admin",
         # Сильные пароли
-        strong_passwords = [
-            "MyStrongPassword123!",
-            "Complex@Pass1",
-            "Secure#Password456",
-            "Strong$Pass789"
-        ]
-        
-        # Все пароли должны хешироваться (логика проверки сложности на уровне валидации)
-        for password in weak_passwords + strong_passwords:
-            hashed = get_password_hash(password)
-            assert verify_password(password, hashed) is True
+        "MyStrongPassword123!",
+        "Complex@Pass1",
+        "Secure#Password456",
+        "Strong$Pass789"
+    ])
+    @pytest.mark.usefixtures("fast_pwd_context")
+    def test_password_strength_requirements(self, hashed_passwords: dict, password: str):
+        """Тест требований к сложности пароля"""
+        assert verify_password(password, hashed_passwords[password]) is True
 
 
 @pytest.mark.asyncio
 class TestJWTSecurity:
     """Тесты безопасности JWT токенов"""
     
-    def test_jwt_token_creation(self):
+    def test_jwt_token_creation(self, employee_token: str, employee_token_payload: dict):
         """Тест создания JWT токенов"""
-        data = {"sub": "test_user", "user_type": "employee"}
-        token = create_access_token(data)
+        token = employee_token
         
         assert token is not None
         assert isinstance(token, str)
         assert len(token) > 0
         
         # Проверяем что токен содержит правильные данные
-        from app.core.config import settings
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = employee_token_payload
         assert payload["sub"] == "test_user"
         assert payload["user_type"] == "employee"
     
@@ -242,39 +260,64 @@ class TestJWTSecurity:
         assert payload is not None
         assert payload["sub"] == "test_user"
         
-        # Ждем истечения токена
-        time.sleep(2)
-        
-        # Токен должен быть невалиден
-        payload = verify_token(token)
-        assert payload is None
+        # Переводим часы на 5 секунд вперед вместо ожидания истечения токена
+        with time_machine.travel(time.time() + 5, tick=False):
+            # Токен должен быть невалиден
+            payload = verify_token(token)
+            assert payload is None
     
-    def test_jwt_token_tampering(self):
+    def test_jwt_token_tampering(self, employee_token: str):
         """Тест защиты от подделки JWT токенов"""
-        data = {"sub": "test_user", "user_type": "employee"}
-        token = create_access_token(data)
-        
         # Пытаемся изменить токен
-        tampered_token = token[:-5] + "xxxxx"
+        tampered_token = employee_token[:-5] + "xxxxx"
         
         # Поддельный токен должен быть отклонен
         payload = verify_token(tampered_token)
         assert payload is None
     
-    def test_jwt_additional_claims(self):
+    def test_jwt_additional_claims(self, employee_token_payload: dict):
         """Тест дополнительных claims в JWT"""
-        data = {"sub": "test_user", "user_type": "employee"}
-        token = create_access_token(data)
-        
-        from app.core.config import settings
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = employee_token_payload
         
         # Проверяем наличие дополнительных claims
         assert "iat" in payload  # issued at
         assert "exp" in payload  # expires
         assert "jti" in payload  # JWT ID
         assert "iss" in payload  # issuer
-
+    
+    def test_cached_token_rejected_after_expiration(self):
+        """Тест отклонения закешированного токена после истечения exp"""
+        token = create_access_token({"sub": "cached_user"}, expires_delta=timedelta(seconds=30))
+        
+        assert verify_token(token) is not None
+        with _token_cache_lock:
+            assert token in _token_cache
+        
+        # time_machine переводит и monotonic-часы кеша: запись устаревает вместе с exp
+        with time_machine.travel(time.time() + 31, tick=False):
+            assert verify_token(token) is None
+            with _token_cache_lock:
+                assert token not in _token_cache
+    
+    def test_token_cache_entry_bounded_by_ttl(self):
+        """Тест ограничения жизни записи кеша TOKEN_CACHE_TTL и сроком токена"""
+        now = 1000.0
+        
+        # Долгоживущий токен: запись живет ровно TOKEN_CACHE_TTL
+        long_token = create_access_token({"sub": "cached_user"}, expires_delta=timedelta(hours=1))
+        long_payload = verify_token(long_token)
+        assert _token_cache_ttu(long_token, long_payload, now) == now + TOKEN_CACHE_TTL
+        
+        # Токен истекает раньше TTL: запись устаревает вместе с токеном
+        short_token = create_access_token({"sub": "cached_user"}, expires_delta=timedelta(seconds=10))
+        short_payload = verify_token(short_token)
+        assert _token_cache_ttu(short_token, short_payload, now) <= now + 10
+        
+        # Через TOKEN_CACHE_TTL запись удалена, а еще валидный токен проверяется заново
+        with time_machine.travel(time.time() + TOKEN_CACHE_TTL + 1, tick=False):
+            with _token_cache_lock:
+                assert long_token not in _token_cache
+            assert verify_token(long_token) == long_payload
 
 @pytest.mark.asyncio
 class TestXSSProtection:
@@ -290,19 +333,17 @@ class TestXSSProtection:
         assert "&lt;/script&gt;" in safe_output
         assert "<script>" not in safe_output
     
-    def test_sanitize_output_complex(self):
+    @pytest.mark.parametrize("dangerous,expected", [
+        ("<img src=x onerror=alert('XSS')>", "&lt;img src=x onerror=alert('XSS')&gt;"),
+        ("<div onclick='alert(1)'>Click</div>", "&lt;div onclick='alert(1)'&gt;Click&lt;/div&gt;"),
+        ("javascript:alert('XSS')", "javascript:alert('XSS')"),  # Не HTML, но опасно
+        ("<iframe src='javascript:alert(1)'></iframe>", "&lt;iframe src='javascript:alert(1)'&gt;&lt;/iframe&gt;")
+    ])
+    def test_sanitize_output_complex(self, dangerous: str, expected: str):
         """Тест сложной санитизации"""
-        test_cases = [
-            ("<img src=x onerror=alert('XSS')>", "&lt;img src=x onerror=alert('XSS')&gt;"),
-            ("<div onclick='alert(1)'>Click</div>", "&lt;div onclick='alert(1)'&gt;Click&lt;/div&gt;"),
-            ("javascript:alert('XSS')", "javascript:alert('XSS')"),  # Не HTML, но опасно
-            ("<iframe src='javascript:alert(1)'></iframe>", "&lt;iframe src='javascript:alert(1)'&gt;&lt;/iframe&gt;")
-        ]
-        
-        for dangerous, expected in test_cases:
-            safe_output = sanitize_output(dangerous)
-            assert "<" not in safe_output or "&lt;" in safe_output
-            assert ">" not in safe_output or "&gt;" in safe_output
+        safe_output = sanitize_output(dangerous)
+        assert "<" not in safe_output or "&lt;" in safe_output
+        assert ">" not in safe_output or "&gt;" in safe_output
     
     def test_sanitize_output_safe_content(self):
         """Тест что безопасный контент не изменяется"""
@@ -314,42 +355,30 @@ class TestXSSProtection:
     def test_sanitize_output_data_structures(self):
         """Тест санитизации структур данных"""
         # Словарь с опасными данными
-        dangerous_dict = {
-            "name": "<script>alert('XSS')</script>",
-            "description": "Нормальное описание",
-            "html": "<div>Контент</div>"
-        }
-        
-        safe_dict = sanitize_output(dangerous_dict)
+        safe_dict = _SAFE_DICT
         
         assert "&lt;script&gt;" in safe_dict["name"]
         assert safe_dict["description"] == "Нормальное описание"
         assert "&lt;div&gt;" in safe_dict["html"]
         
         # Список с опасными данными
-        dangerous_list = [
-            "<script>alert('XSS')</script>",
-            "Безопасный текст",
-            "<img src=x onerror=alert(1)>"
-        ]
-        
-        safe_list = sanitize_output(dangerous_list)
+        safe_list = _SAFE_LIST
         
         assert "&lt;script&gt;" in safe_list[0]
         assert safe_list[1] == "Безопасный текст"
         assert "&lt;img" in safe_list[2]
 
 
+# Общий ответ health_response: под xdist вместе на одном воркере
 @pytest.mark.asyncio
+@pytest.mark.xdist_group("readonly")
 class TestSecurityHeaders:
     """Тесты заголовков безопасности"""
     
-    async def test_security_headers_middleware(self, client: TestClient):
+    async def test_security_headers_middleware(self, health_response):
         """Тест middleware заголовков безопасности"""
-        response = client.get("/health")
-        
         # Проверяем наличие заголовков безопасности
-        headers = response.headers
+        headers = health_response.headers
         
         assert "Content-Security-Policy" in headers
         assert "X-Content-Type-Options" in headers
@@ -364,11 +393,9 @@ class TestSecurityHeaders:
         assert headers["X-XSS-Protection"] == "1; mode=block"
         assert "strict-origin-when-cross-origin" in headers["Referrer-Policy"]
     
-    async def test_csp_header_content(self, client: TestClient):
+    async def test_csp_header_content(self, health_response):
         """Тест содержимого CSP заголовка"""
-        response = client.get("/health")
-        
-        csp_header = response.headers.get("Content-Security-Policy")
+        csp_header = health_response.headers.get("Content-Security-Policy")
         assert csp_header is not None
         
         # Проверяем основные директивы CSP
@@ -378,12 +405,10 @@ class TestSecurityHeaders:
         assert "img-src 'self'" in csp_header
         assert "frame-ancestors 'none'" in csp_header
     
-    async def test_server_header_removal(self, client: TestClient):
+    async def test_server_header_removal(self, health_response):
         """Тест удаления заголовка Server"""
-        response = client.get("/health")
-        
         # Заголовок Server должен быть удален или не содержать информацию о сервере
-        server_header = response.headers.get("Server")
+        server_header = health_response.headers.get("Server")
         if server_header:
             assert "uvicorn" not in server_header.lower()
             assert "fastapi" not in server_header.lower()
@@ -404,9 +429,10 @@ class TestRateLimiting:
             assert "X-RateLimit-Limit" in response.headers
             assert "X-RateLimit-Remaining" in response.headers
     
-    async def test_rate_limiting_headers(self, client: TestClient):
+    @pytest.mark.xdist_group("readonly")
+    async def test_rate_limiting_headers(self, health_response):
         """Тест заголовков rate limiting"""
-        response = client.get("/health")
+        response = health_response
         
         # Проверяем заголовки
         assert "X-RateLimit-Limit" in response.headers
@@ -453,10 +479,15 @@ class TestRequestSizeLimiting:
     
     async def test_large_request_rejection(self, authenticated_client: TestClient):
         """Тест отклонения больших запросов"""
-        # Создаем очень большой запрос (больше 10MB)
-        large_data = {"large_field": "x" * (11 * 1024 * 1024)}  # 11MB
+        # Тело ровно на байт больше лимита RequestSizeLimitMiddleware (10MB по умолчанию):
+        # middleware смотрит только на Content-Length, так что JSON собирать не нужно
+        large_body = b"x" * (MAX_REQUEST_SIZE + 1)
         
-        response = authenticated_client.post("/api/v1/requests/", json=large_data)
+        response = authenticated_client.post(
+            "/api/v1/requests/",
+            content=large_body,
+            headers={"Content-Type": "application/json"}
+        )
         
         # Должна быть ошибка размера запроса
         assert response.status_code == 413
@@ -511,33 +542,30 @@ class TestAuthenticationSecurity:
         test_employee: Employee
     ):
         """Тест защиты от брутфорса"""
-        # Делаем много неуспешных попыток входа
-        for i in range(6):
+        # Неуспешные попытки записываем напрямую, а не реальными входами с bcrypt;
+        # patch.dict возвращает хранилище попыток в исходное состояние
+        with patch.dict(login_attempts):
+            for _ in range(settings.LOGIN_ATTEMPTS_PER_HOUR):
+                LoginAttemptTracker.record_login_attempt(TEST_CLIENT_IP, test_employee.login, False)
+            
             response = client.post("/api/v1/auth/login", json={
                 "login": test_employee.login,
                 "password": "wrong_password"
             })
             
-            if i < 5:
-                assert response.status_code == 401
-            else:
-                # После 5 неуспешных попыток аккаунт должен быть заблокирован
-                assert response.status_code == 423  # Locked
+            # После 5 неуспешных попыток аккаунт должен быть заблокирован
+            assert response.status_code == 423  # Locked
     
     async def test_session_management(
         self, 
         client: TestClient, 
-        test_employee: Employee
+        test_employee: Employee,
+        employee_access_token: str
     ):
         """Тест управления сессиями"""
-        # Логинимся
-        response = client.post("/api/v1/auth/login", json={
-            "login": test_employee.login,
-            "password": "test_password"
-        })
-        
-        assert response.status_code == 200
-        token = response.json()["access_token"]
+        # Сам вход проверяет test_authentication_with_valid_credentials;
+        # здесь берем готовый токен без bcrypt и лишнего запроса
+        token = employee_access_token
         
         # Используем токен для доступа к защищенному ресурсу
         protected_response = client.get("/api/v1/requests/",
@@ -576,8 +604,8 @@ class TestFileSecurityValidation:
     
     async def test_file_size_validation(self, authenticated_client: TestClient, test_request):
         """Тест валидации размера файлов"""
-        # Большой файл
-        large_file = b"x" * (11 * 1024 * 1024)  # 11MB
+        # Файл на байт больше допустимого
+        large_file = b"x" * (settings.MAX_FILE_SIZE + 1)
         files = {"file": ("large.jpg", large_file, "image/jpeg")}
         
         response = authenticated_client.post(
@@ -611,18 +639,39 @@ class TestFileSecurityValidation:
         assert response.status_code == 400
         assert "безопасности" in response.json()["detail"]
     
-    async def test_path_traversal_protection(self, authenticated_client: TestClient):
+    # Попытка доступа к файлу вне разрешенной директории
+    @pytest.mark.parametrize("path", [
+        "../../../etc/passwd",
+        "..\\..\\..\\windows\\system32\\config\\sam",
+        "/etc/passwd",
+        "C:\\Windows\\System32\\config\\sam"
+    ])
+    async def test_path_traversal_protection(self, authenticated_client: TestClient, path: str):
         """Тест защиты от path traversal атак"""
-        # Попытка доступа к файлу вне разрешенной директории
-        dangerous_paths = [
-            "../../../etc/passwd",
-            "..\\..\\..\\windows\\system32\\config\\sam",
-            "/etc/passwd",
-            "C:\\Windows\\System32\\config\\sam"
-        ]
-        
-        for path in dangerous_paths:
-            response = authenticated_client.get(f"/api/v1/secure-files/download/{path}")
-            
-            # Должна быть ошибка доступа
-            assert response.status_code in [400, 403, 404] 
\ No newline at end of file
+        response = authenticated_client.get(f"/api/v1/secure-files/download/{path}")
+        
+        # Должна быть ошибка доступа
+        assert response.status_code in [400, 403, 404] 
+
+
+@pytest.fixture(scope="class")
+def employee_token() -> str:
+    """JWT токен сотрудника, подписанный один раз на класс"""
+    return create_access_token({"sub": "test_user", "user_type": "employee"})
+
+
+@pytest.fixture(scope="class")
+def employee_token_payload(employee_token: str) -> dict:
+    """Claims токена сотрудника; подпись проверяется один раз на класс"""
+    return jwt.decode(employee_token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+
+
+@pytest.fixture
+def employee_access_token(test_employee: Employee, test_role: Role) -> str:
+    """Токен сотрудника с теми же claims, что выдает /api/v1/auth/login"""
+    return create_access_token({
+        "sub": test_employee.login,
+        "user_type": test_role.name,
+        "user_id": test_employee.id,
+        "role": test_role.name
+    })
@@ -1,16 +1,20 @@
 import pytest
+import httpx
 from fastapi.testclient import TestClient
 from app.main import app
-from app.core.auth import get_password_hash, verify_password
+from app.core.auth import verify_password
+from app.core.config import settings
 
 
 class TestBasicFunctionality:
     """Базовые тесты функциональности"""
     
-    def test_password_hashing(self):
+    @pytest.mark.xdist_group("passwords")
+    @pytest.mark.usefixtures("fast_pwd_context")
+    def test_password_hashing(self, hashed_passwords: dict):
         """Тест хеширования паролей"""
         password = "test_password_123"
-        hashed = get_password_hash(password)
+        hashed = hashed_passwords[password]
         
         assert hashed != password
         assert verify_password(password, hashed) is True
@@ -21,56 +25,55 @@ class TestBasicFunctionality:
         assert app is not None
         assert app.title == "Система управления заявками"
     
-    def test_client_creation(self):
+    @pytest.mark.xdist_group("readonly")
+    def test_client_creation(self, session_client: TestClient):
         """Тест создания тестового клиента"""
-        with TestClient(app) as client:
-            assert client is not None
+        assert session_client is not None
 
 
+# Общие session_client и ASGI-транспорт: под xdist вместе на одном воркере
+@pytest.mark.xdist_group("readonly")
 class TestAPIEndpoints:
     """Тесты API endpoints без БД"""
     
-    def test_health_endpoint_exists(self):
+    def test_health_endpoint_exists(self, session_client: TestClient):
         """Тест существования health endpoint"""
-        with TestClient(app) as client:
-            response = client.get("/api/v1/health")
-            # Может быть 200 или 500 (из-за БД), главное что endpoint существует
-            assert response.status_code in [200, 500]
+        response = session_client.get("/api/v1/health")
+        # Может быть 200 или 500 (из-за БД), главное что endpoint существует
+        assert response.status_code in [200, 500]
     
-    def test_docs_endpoint(self):
+    # Документации не нужны БД и кеш, поэтому запрос идет через ASGI-транспорт без lifespan
+    async def test_docs_endpoint(self, async_client: httpx.AsyncClient):
         """Тест документации API"""
-        with TestClient(app) as client:
-            response = client.get("/docs")
-            assert response.status_code == 200
+        response = await async_client.get("/docs")
+        assert response.status_code == 200
     
-    def test_openapi_endpoint(self):
+    async def test_openapi_endpoint(self, async_client: httpx.AsyncClient, openapi_schema: bytes):
         """Тест OpenAPI схемы"""
-        with TestClient(app) as client:
-            response = client.get("/openapi.json")
-            assert response.status_code == 200
-            data = response.json()
-            assert "info" in data
-            assert "paths" in data
-    
-    def test_unauthorized_requests(self):
+        response = await async_client.get("/openapi.json")
+        assert response.status_code == 200
+        # Маршрут отдает ту же схему, что закеширована в app.openapi_schema
+        assert response.content == openapi_schema
+        
+        schema = response.json()
+        assert "info" in schema
+        assert "paths" in schema
+    
+    # Эти endpoints должны возвращать 401
+    @pytest.mark.parametrize("endpoint", [
+        "/api/v1/requests/",
+        "/api/v1/transactions/",
+        "/api/v1/metrics"
+    ])
+    def test_unauthorized_requests(self, session_client: TestClient, endpoint: str):
         """Тест неавторизованных запросов"""
-        with TestClient(app) as client:
-            # Эти endpoints должны возвращать 401
-            endpoints = [
-                "/api/v1/requests/",
-                "/api/v1/transactions/", 
-                "/api/v1/metrics"
-            ]
-            
-            for endpoint in endpoints:
-                response = client.get(endpoint)
-                assert response.status_code == 401
-    
-    def test_nonexistent_endpoint(self):
+        response = session_client.get(endpoint)
+        assert response.status_code == 401
+    
+    def test_nonexistent_endpoint(self, session_client: TestClient):
         """Тест несуществующего endpoint"""
-        with TestClient(app) as client:
-            response = client.get("/api/v1/nonexistent")
-            assert response.status_code == 404
+        response = session_client.get("/api/v1/nonexistent")
+        assert response.status_code == 404
 
 
 class TestAuthenticationLogic:
@@ -87,10 +90,12 @@ class TestAuthenticationLogic:
         assert isinstance(token, str)
         assert len(token) > 0
     
-    def test_password_verification(self):
+    @pytest.mark.xdist_group("passwords")
+    @pytest.mark.usefixtures("fast_pwd_context")
+    def test_password_verification(self, hashed_passwords: dict):
         """Тест проверки паролей"""
         password = "secure_password_123"
-        hashed = get_password_hash(password)
+        hashed = hashed_passwords[password]
         
         # Правильный пароль
         assert verify_password(password, hashed) is True
@@ -101,13 +106,15 @@ class TestAuthenticationLogic:
         # Пустой пароль
         assert verify_password("", hashed) is False
     
-    def test_different_passwords_different_hashes(self):
+    @pytest.mark.xdist_group("passwords")
+    @pytest.mark.usefixtures("fast_pwd_context")
+    def test_different_passwords_different_hashes(self, hashed_passwords: dict):
         """Тест что разные пароли дают разные хеши"""
         password1 = "password1"
         password2 = "password2"
         
-        hash1 = get_password_hash(password1)
-        hash2 = get_password_hash(password2)
+        hash1 = hashed_passwords[password1]
+        hash2 = hashed_passwords[password2]
         
         assert hash1 != hash2
         assert verify_password(password1, hash1) is True
@@ -121,24 +128,18 @@ class TestConfiguration:
     
     def test_app_settings(self):
         """Тест настроек приложения"""
-        from app.core.config import settings
-        
         assert settings.SECRET_KEY is not None
         assert settings.ALGORITHM == "HS256"
         assert settings.ACCESS_TOKEN_EXPIRE_MINUTES > 0
     
     def test_database_url(self):
         """Тест URL базы данных"""
-        from app.core.config import settings
-        
         db_url = settings.DATABASE_URL
         assert db_url is not None
         assert "postgresql" in db_url or "sqlite" in db_url
     
     def test_file_upload_settings(self):
         """Тест настроек загрузки файлов"""
-        from app.core.config import settings
-        
         assert settings.MAX_FILE_SIZE > 0
         assert settings.UPLOAD_DIR is not None
         assert len(settings.get_allowed_file_types) > 0
@@ -149,8 +150,6 @@ class TestUtilities:
     
     def test_file_type_validation(self):
         """Тест валидации типов файлов"""
-        from app.core.config import settings
-        
         allowed_types = settings.get_allowed_file_types
         assert "jpg" in allowed_types
         assert "pdf" in allowed_types
@@ -158,13 +157,9 @@ class TestUtilities:
     
     def test_environment_detection(self):
         """Тест определения окружения"""
-        from app.core.config import settings
-        
         assert settings.ENVIRONMENT in ["development", "production", "testing"]
     
     def test_security_settings(self):
         """Тест настроек безопасности"""
-        from app.core.config import settings
-        
         assert settings.RATE_LIMIT_PER_MINUTE > 0
         assert settings.LOGIN_ATTEMPTS_PER_HOUR > 0 
\ No newline at end of file
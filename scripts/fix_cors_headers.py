@@ -6,94 +6,118 @@
 
 import os
 import re
+import shutil
 import sys
 from pathlib import Path
 
-def add_cors_import(file_content: str) -> str:
+_CORS_IMPORT = b"from ..core.cors_utils import create_cors_response, get_cors_headers"
+
+# Паттерны компилируются один раз при загрузке, а не при каждом вызове re.sub.
+# Файлы обрабатываются как bytes: все паттерны ASCII, декодировать исходники не нужно
+# Начало объявления роутера: импорты после него не рассматриваются
+_PAT_ROUTER_START = re.compile(rb'^(?:router = |@router)', re.MULTILINE)
+# Строка импорта из ..core. (кроме самого cors_utils) вместе с переводом строки
+_PAT_CORE_IMPORT = re.compile(rb'^from \.\.core\.(?![^\n]*cors_utils)[^\n]*\n?', re.MULTILINE)
+# Все hardcoded CORS конструкции ищутся одним проходом по файлу.
+# Порядок альтернатив важен: simple раньше content, origin раньше остальных assignments
+_CORS_HEADERS_DICT = (
+    rb'headers=\{\s*"Access-Control-Allow-Origin": "http://localhost:3000",\s*'
+    rb'"Access-Control-Allow-Methods": "(?P<%s>[^"]+)",\s*'
+    rb'"Access-Control-Allow-Headers": "[^"]+",\s*'
+    rb'"Access-Control-Allow-Credentials": "[^"]+",?\s*\}\s*\)'
+)
+_PAT_CORS = re.compile(
+    # Простые OPTIONS handlers
+    rb'(?P<simple>return JSONResponse\(\s*content=\{\},\s*'
+    + _CORS_HEADERS_DICT % b"simple_methods" + rb')'
+    # JSONResponse с контентом
+    rb'|(?P<content>return JSONResponse\(\s*content=(?P<content_part>[^,]+),\s*'
+    + _CORS_HEADERS_DICT % b"content_methods" + rb')'
+    # response.headers["Access-Control-Allow-Origin"] = "http://localhost:3000"
+    rb'|(?P<origin>response\.headers\["Access-Control-Allow-Origin"\] = "http://localhost:3000")'
+    # Остальные hardcoded CORS assignments
+    rb'|(?P<header>response\.headers\["Access-Control-Allow-[^"]+"\] = "[^"]*"[\s\n]*)',
+    re.MULTILINE | re.DOTALL
+)
+
+def add_cors_import(file_content: bytes) -> bytes:
     """Добавляет импорт cors_utils если его нет"""
-    if "from ..core.cors_utils import" in file_content:
+    if b"from ..core.cors_utils import" in file_content:
         return file_content
     
-    # Найти место для вставки импорта (после других imports)
-    lines = file_content.split('\n')
-    insert_index = 0
+    # Найти место для вставки импорта (после других imports ..core. до объявления router),
+    # не разбивая файл на строки
+    router_match = _PAT_ROUTER_START.search(file_content)
+    end = router_match.start() if router_match else len(file_content)
+    insert_at = 0
+    for match in _PAT_CORE_IMPORT.finditer(file_content, 0, end):
+        insert_at = match.end()
     
-    for i, line in enumerate(lines):
-        if line.startswith('from ..core.') and 'cors_utils' not in line:
-            insert_index = i + 1
-        elif line.startswith('router = ') or line.startswith('@router'):
-            break
-    
-    lines.insert(insert_index, "from ..core.cors_utils import create_cors_response, get_cors_headers")
-    return '\n'.join(lines)
+    if insert_at and file_content[insert_at - 1:insert_at] != b"\n":
+        # Последний импорт стоит в конце файла без перевода строки
+        return file_content + b"\n" + _CORS_IMPORT
+    return file_content[:insert_at] + _CORS_IMPORT + b"\n" + file_content[insert_at:]
 
-def replace_simple_jsonresponse_cors(content: str) -> str:
-    """Заменяет простые JSONResponse с CORS headers на create_cors_response"""
-    # Паттерн для простых OPTIONS handlers
-    pattern = r'return JSONResponse\(\s*content=\{\},\s*headers=\{\s*"Access-Control-Allow-Origin": "http://localhost:3000",\s*"Access-Control-Allow-Methods": "([^"]+)",\s*"Access-Control-Allow-Headers": "[^"]+",\s*"Access-Control-Allow-Credentials": "[^"]+",?\s*\}\s*\)'
-    
-    def replacement(match):
-        methods = match.group(1)
-        return f'return create_cors_response(allowed_methods="{methods}")'
-    
-    return re.sub(pattern, replacement, content, flags=re.MULTILINE | re.DOTALL)
+def _replace_cors_match(match: re.Match) -> bytes:
+    """Возвращает замену для найденной CORS конструкции"""
+    kind = match.lastgroup
+    if kind == "simple":
+        methods = match.group("simple_methods")
+        return b'return create_cors_response(allowed_methods="%s")' % methods
+    if kind == "content":
+        content_part = match.group("content_part")
+        methods = match.group("content_methods")
+        return b'cors_headers = get_cors_headers("%s")\n    return JSONResponse(content=%s, headers=cors_headers)' % (methods, content_part)
+    if kind == "origin":
+        return b'# CORS headers will be set by middleware or cors_utils'
+    # Остальные hardcoded CORS assignments убираем
+    return b''
 
-def replace_jsonresponse_with_content(content: str) -> str:
-    """Заменяет JSONResponse с content и CORS headers"""
-    # Паттерн для JSONResponse с контентом
-    pattern = r'return JSONResponse\(\s*content=([^,]+),\s*headers=\{\s*"Access-Control-Allow-Origin": "http://localhost:3000",\s*"Access-Control-Allow-Methods": "([^"]+)",\s*"Access-Control-Allow-Headers": "[^"]+",\s*"Access-Control-Allow-Credentials": "[^"]+",?\s*\}\s*\)'
-    
-    def replacement(match):
-        content_part = match.group(1)
-        methods = match.group(2)
-        return f'cors_headers = get_cors_headers("{methods}")\n    return JSONResponse(content={content_part}, headers=cors_headers)'
-    
-    return re.sub(pattern, replacement, content, flags=re.MULTILINE | re.DOTALL)
-
-def replace_headers_assignment(content: str) -> str:
-    """Заменяет прямое присваивание CORS headers"""
-    # Паттерн для response.headers["Access-Control-Allow-Origin"] = "http://localhost:3000"
-    content = re.sub(
-        r'response\.headers\["Access-Control-Allow-Origin"\] = "http://localhost:3000"',
-        '# CORS headers will be set by middleware or cors_utils',
-        content
-    )
-    
-    # Убираем остальные hardcoded CORS assignments
-    content = re.sub(
-        r'response\.headers\["Access-Control-Allow-[^"]+"\] = "[^"]*"[\s\n]*',
-        '',
-        content
-    )
-    
-    return content
+def replace_cors_headers(content: bytes) -> bytes:
+    """Заменяет hardcoded CORS headers за один проход по файлу"""
+    return _PAT_CORS.sub(_replace_cors_match, content)
 
 def fix_file(file_path: Path) -> bool:
     """Исправляет CORS headers в одном файле"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
+        with open(file_path, 'rb') as f:
             content = f.read()
         
+        # Все CORS паттерны содержат эту подстроку: без нее regex не нужен,
+        # и импорт cors_utils в такой файл не добавляем
+        if b"Access-Control-Allow" not in content:
+            print(f"ℹ️  No changes needed in {file_path}")
+            return False
+        
         original_content = content
         
         # Добавляем импорт
         content = add_cors_import(content)
         
         # Заменяем различные паттерны CORS headers
-        content = replace_simple_jsonresponse_cors(content)
-        content = replace_jsonresponse_with_content(content)
-        content = replace_headers_assignment(content)
+        content = replace_cors_headers(content)
         
         # Если есть изменения, записываем файл
         if content != original_content:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            # Пишем во временный файл рядом и атомарно подменяем исходный,
+            # чтобы прерванный запуск не оставил модуль записанным наполовину
+            tmp_path = file_path.with_name(file_path.name + ".tmp")
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(content)
+                shutil.copymode(file_path, tmp_path)
+                os.replace(tmp_path, file_path)
+            except BaseException:
+                # Ни ошибка записи, ни прерванный запуск не оставляют .tmp рядом с исходником
+                if tmp_path.exists():
+                    os.unlink(tmp_path)
+                raise
             print(f"✅ Fixed CORS headers in {file_path}")
             return True
         else:
             print(f"ℹ️  No changes needed in {file_path}")
             return False
-            
+    
     except Exception as e:
         print(f"❌ Error processing {file_path}: {e}")
         return False
@@ -121,9 +145,12 @@ def main():
     
     fixed_count = 0
     
+    # Одно чтение каталога вместо stat на каждый файл
+    existing_files = {entry.name for entry in os.scandir(api_dir) if entry.is_file()}
+    
     for file_name in api_files:
         file_path = api_dir / file_name
-        if file_path.exists():
+        if file_name in existing_files:
             if fix_file(file_path):
                 fixed_count += 1
         else: